@@ -0,0 +1,248 @@
+import argparse, json, os, platform, statistics, subprocess, sys, time
+
+from data_structures import LinkedList, Stack, Queue, PriorityQueue
+from engine import GameState, greedy_policy, play
+from grid import generate_city
+from operations import find_path_a_star
+from pathfinding import HierarchicalPathfinder, PathCache
+
+SIZES = (10**3, 10**4, 10**5, 10**6)
+GRID_SIZES = (50, 100, 200, 400)
+DENSITIES = (0.1, 0.2, 0.3)
+HPA_GRID_SIZES = (400, 1000, 2000) # HierarchicalPathfinder is for big maps; run at the default density only
+TOLERANCE = 0.15 # slowdown allowed by --compare before a benchmark counts as a regression
+
+
+# Each benchmark is a function taking the problem size and returning (run, operations):
+# run() is timed, operations is how many units of work one run does (for ops/s).
+
+def bench_linked_list_append(n):
+    def run():
+        history = LinkedList()
+        for i in range(n):
+            history.append(i)
+    return run, n
+
+
+def bench_linked_list_append_capped(n):
+    def run():
+        history = LinkedList(max_length=1000) # the game's history keeps a bounded tail
+        for i in range(n):
+            history.append(i)
+    return run, n
+
+
+def bench_stack_push_pop(n):
+    def run():
+        stack = Stack()
+        for i in range(n):
+            stack.push(i)
+        while not stack.is_empty():
+            stack.pop()
+    return run, 2 * n
+
+
+def bench_queue_enqueue_dequeue(n):
+    def run():
+        queue = Queue()
+        for i in range(n):
+            queue.enqueue(i)
+        while not queue.is_empty():
+            queue.dequeue()
+    return run, 2 * n
+
+
+def bench_priority_queue_enqueue_dequeue(n):
+    priorities = [(i * 7919) % 1000 for i in range(n)] # fixed, well-mixed priorities
+
+    def run():
+        queue = PriorityQueue(max_size=None)
+        for i, priority in enumerate(priorities):
+            queue.enqueue(i, priority)
+        while len(queue):
+            queue.dequeue()
+    return run, 2 * n
+
+
+def _city_route(size, density):
+    grid, start, nodes, _ = generate_city(size, size, seed=size, obstacle_density=density)
+    # The location farthest from the base by Manhattan distance gives the longest route
+    target = max(((record['x'], record['y']) for record in nodes.values()),
+                 key=lambda position: abs(position[0] - start[0]) + abs(position[1] - start[1]))
+    return grid, start, target
+
+
+def bench_a_star(size, density):
+    grid, start, target = _city_route(size, density)
+
+    def run():
+        find_path_a_star(start, target, grid)
+    return run, 1
+
+
+def bench_path_cache(size, density):
+    grid, start, target = _city_route(size, density)
+    cache = PathCache(grid, [target])
+    cache.find_path(start, target) # build the table outside the timing
+
+    def run():
+        cache.find_path(start, target)
+    return run, 1
+
+
+def bench_hpa(size, density, warm):
+    grid, start, target = _city_route(size, density)
+    if not warm:
+        def run():
+            HierarchicalPathfinder(grid).find_path(start, target) # every cluster on the route analysed from scratch
+        return run, 1
+
+    finder = HierarchicalPathfinder(grid)
+    finder.find_path(start, target)
+
+    def run():
+        finder.find_path(start, target)
+    return run, 1
+
+
+def bench_headless_turns(games):
+    def run():
+        turns = 0
+        for seed in range(games):
+            turns += play(GameState(seed=seed, capture_output=False), greedy_policy, 500, seed)["turns"]
+        run.turns = turns
+    run()
+    return run, run.turns
+
+
+def bench_startup(script_input):
+    # A scripted session from process launch to exit: interpreter start, imports, story text, first command
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+    def run():
+        subprocess.run([sys.executable, main_script, "--pace", "0"], input=script_input.encode(),
+                       stdout=subprocess.DEVNULL, check=True)
+    return run, 1
+
+
+def benchmarks(max_size, quick):
+    """
+    (name, factory, argument) for every benchmark in the suite.
+    """
+    sizes = [n for n in SIZES if n <= max_size]
+    cases = []
+    for n in sizes:
+        cases.append((f"linked_list.append[{n}]", bench_linked_list_append, (n,)))
+        cases.append((f"linked_list.append_capped[{n}]", bench_linked_list_append_capped, (n,)))
+        cases.append((f"stack.push_pop[{n}]", bench_stack_push_pop, (n,)))
+        cases.append((f"queue.enqueue_dequeue[{n}]", bench_queue_enqueue_dequeue, (n,)))
+        cases.append((f"priority_queue.enqueue_dequeue[{n}]", bench_priority_queue_enqueue_dequeue, (n,)))
+    for size in GRID_SIZES[:2] if quick else GRID_SIZES:
+        for density in DENSITIES:
+            cases.append((f"a_star[{size}x{size},{density}]", bench_a_star, (size, density)))
+            cases.append((f"path_cache[{size}x{size},{density}]", bench_path_cache, (size, density)))
+    for size in HPA_GRID_SIZES[:1] if quick else HPA_GRID_SIZES:
+        cases.append((f"hpa.cold[{size}x{size},0.2]", bench_hpa, (size, 0.2, False)))
+        cases.append((f"hpa.warm[{size}x{size},0.2]", bench_hpa, (size, 0.2, True)))
+    cases.append(("headless.turns", bench_headless_turns, (50 if quick else 300,)))
+    cases.append(("startup.scripted_session", bench_startup, ("Neo\nmap\nquit\n",)))
+    return cases
+
+
+def measure(run, operations, repeat, min_time=0.2):
+    """
+    Times run() like timeit: enough calls per sample to last about min_time / repeat,
+    then `repeat` samples. The minimum is the figure least disturbed by other processes.
+    """
+    started = time.perf_counter()
+    run()
+    once = max(time.perf_counter() - started, 1e-9)
+    number = max(1, int(min_time / repeat / once))
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - started) / number)
+    best = min(samples)
+    return {
+        "seconds": best,
+        "median": statistics.median(samples),
+        "ops_per_second": operations / best,
+        "operations": operations,
+        "calls": number * repeat
+    }
+
+
+def run_suite(max_size=10**6, repeat=5, name_filter=None, quick=False, out=print):
+    results = {}
+    for name, factory, arguments in benchmarks(max_size, quick):
+        if name_filter and name_filter not in name:
+            continue
+        run, operations = factory(*arguments)
+        result = results[name] = measure(run, operations, repeat)
+        out(f"{name:<42} {result['seconds'] * 1000:>10.3f} ms {result['ops_per_second']:>14,.0f} ops/s")
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+
+
+def compare(current, baseline, tolerance=TOLERANCE, out=print):
+    """
+    Prints each benchmark's speed relative to the baseline. Returns the names that got
+    slower by more than `tolerance`.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            out(f"{name:<42} {'new':>10}")
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        status = ""
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            status = "faster"
+        out(f"{name:<42} {ratio:>9.2f}x {status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for The Last Protocol's data structures, pathfinding, engine and startup")
+    parser.add_argument("--max-size", type=int, default=10**5,
+                        help="largest data-structure size to run (up to 1000000)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing samples per benchmark")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="smaller grids and fewer games, for a fast check")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON (use as a baseline later)")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a JSON file from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="relative slowdown counted as a regression (default 0.15)")
+    options = parser.parse_args(argv)
+
+    report = run_suite(options.max_size, options.repeat, options.filter, options.quick)
+
+    if options.json:
+        with open(options.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"\nCompared with {options.compare} ({baseline.get('created', 'unknown date')}):")
+        regressions = compare(report, baseline, options.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {options.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
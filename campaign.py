@@ -0,0 +1,255 @@
+import hashlib, json, marshal, os, string, sys
+
+from grid import Grid
+
+TEXT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_text.json")
+CAMPAIGN_DIR = os.path.join(os.path.dirname(TEXT_FILE), "campaigns")
+DEFAULT_CAMPAIGN = "kathmandu"
+CACHE_FORMAT = 1 # bump when the compiled layout changes, so old caches are ignored
+
+CAMPAIGN_KEYS = ("title", "map", "start", "nodes", "names", "items", "story", "help")
+NODE_TYPES = ("node", "hub")
+NODE_FLAGS = {"node": "hacked", "hub": "unlocked"} # the progress flag each type starts with, set to False
+
+_game_text = None
+_campaigns = {} # name -> loaded campaign, so a thousand simulated games read the pack once
+
+
+class CampaignError(ValueError):
+    pass
+
+
+def game_text():
+    """
+    The story and help text from game_text.json, read on first use.
+    A marshal copy is kept in __pycache__ so later runs skip parsing the JSON;
+    it is keyed by a hash of the file, so editing the text rebuilds it.
+    """
+    global _game_text
+    if _game_text is None:
+        _game_text = _load_compiled(TEXT_FILE)
+    return _game_text
+
+
+def story_text():
+    return game_text()["story"]
+
+
+def help_text():
+    return game_text()["help"]
+
+
+def load_campaign(name=None):
+    """
+    A content pack: a map with its start, nodes and place names, the starting items,
+    and optionally story and help text that replace the defaults from game_text.json.
+    `name` is a pack in campaigns/ (default: kathmandu) or the path of a .json file.
+
+    The first load validates the pack and keeps a compiled marshal copy next to it in
+    __pycache__, keyed by a hash of the file; after that a start-up only reads and hashes
+    the file, however big the city is. Raises CampaignError for a missing or invalid pack.
+    """
+    name = name or DEFAULT_CAMPAIGN
+    content = _campaigns.get(name)
+    if content is None:
+        content = dict(_load_compiled(_campaign_path(name), _compile_campaign))
+        content["story"] = dict(story_text(), **content["story"])
+        content["help"] = content["help"] or help_text()
+        _campaigns[name] = content
+    return content
+
+
+def available_campaigns():
+    try:
+        return sorted(os.path.splitext(entry)[0] for entry in os.listdir(CAMPAIGN_DIR) if entry.endswith(".json"))
+    except OSError:
+        return []
+
+
+def campaign_city(content):
+    """
+    Builds a fresh, independent copy of a campaign's city.
+    Returns (grid, start_position, node_locations, location_names), like grid.generate_city.
+    """
+    grid = Grid(0, 0)
+    grid.rows, grid.cols, grid.cells = content["rows"], content["cols"], bytearray(content["cells"])
+    node_locations = {key: dict(record) for key, record in content["nodes"].items()}
+    return grid, content["start"], node_locations, dict(content["names"])
+
+
+def classic_city():
+    """
+    Builds a fresh copy of the hand-made Kathmandu map.
+    """
+    return campaign_city(load_campaign(DEFAULT_CAMPAIGN))
+
+
+def _campaign_path(name):
+    if name.endswith(".json") or os.sep in name:
+        path = name
+    else:
+        path = os.path.join(CAMPAIGN_DIR, name + ".json")
+    if not os.path.isfile(path):
+        raise CampaignError(f"No campaign called {name!r} (looked for {path})")
+    return os.path.abspath(path)
+
+
+def _load_compiled(path, compile=None):
+    # JSON file -> (optionally) compile(data, path) -> marshal cache in __pycache__ beside the file
+    with open(path, "rb") as source_file:
+        raw = source_file.read()
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_dir = os.path.join(os.path.dirname(path), "__pycache__")
+    digest = hashlib.blake2b(raw, digest_size=12).hexdigest()
+    cache = os.path.join(cache_dir, f"{name}.{CACHE_FORMAT}-{digest}.marshal")
+    try:
+        with open(cache, "rb") as cache_file:
+            return marshal.load(cache_file)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass # no cache yet, or a damaged one
+
+    try:
+        data = json.loads(raw)
+    except ValueError as error:
+        if compile is None:
+            raise
+        raise CampaignError(f"{path}: not valid JSON ({error})")
+    if compile is not None:
+        data = compile(data, path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for old in os.listdir(cache_dir):
+            if old.startswith(name + ".") and old.endswith(".marshal"):
+                os.remove(os.path.join(cache_dir, old))
+        temporary = f"{cache}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as cache_file:
+            marshal.dump(data, cache_file)
+        os.replace(temporary, cache)
+    except OSError:
+        pass # read-only install; just parse the JSON every time
+    return data
+
+
+def _compile_campaign(data, path):
+    """
+    Checks a parsed pack and turns it into the compact form the game loads:
+    the map as raw cell bytes, positions as tuples and names keyed by position.
+    """
+    def fail(message):
+        raise CampaignError(f"{path}: {message}")
+
+    def position(value, what):
+        if not (isinstance(value, (list, tuple)) and len(value) == 2 and all(type(n) is int for n in value)):
+            fail(f"{what} must be [row, column]")
+        x, y = value
+        if not (0 <= x < rows and 0 <= y < cols):
+            fail(f"{what} ({x}, {y}) is off the {rows}x{cols} map")
+        return x, y
+
+    if not isinstance(data, dict):
+        fail("a campaign is a JSON object")
+    unknown = set(data) - set(CAMPAIGN_KEYS)
+    if unknown:
+        fail(f"unknown keys {sorted(unknown)} (expected some of {list(CAMPAIGN_KEYS)})")
+    for key in ("map", "start", "nodes"):
+        if key not in data:
+            fail(f"missing '{key}'")
+
+    rows_text = data["map"]
+    if not (isinstance(rows_text, list) and rows_text and all(isinstance(row, str) for row in rows_text)):
+        fail("'map' must be a non-empty list of strings, one per row")
+    rows, cols = len(rows_text), len(rows_text[0])
+    if not cols or any(len(row) != cols for row in rows_text):
+        fail("every map row must have the same, non-zero length")
+    odd = set("".join(rows_text)) - set("." + string.ascii_uppercase)
+    if odd:
+        fail(f"map cells must be '.', 'X' or a capital letter, not {sorted(odd)}")
+    grid = Grid.from_rows(rows_text)
+
+    start = position(data["start"], "start")
+    if grid.is_blocked(*start):
+        fail(f"start {start} is an obstacle")
+
+    nodes, taken = {}, {}
+    if not isinstance(data["nodes"], dict) or not data["nodes"]:
+        fail("'nodes' must map keys to {\"x\", \"y\", \"type\"}")
+    for key, record in data["nodes"].items():
+        if not isinstance(record, dict) or set(record) != {"x", "y", "type"}:
+            fail(f"node {key!r} needs exactly x, y and type")
+        if record["type"] not in NODE_TYPES:
+            fail(f"node {key!r} has type {record['type']!r}; expected one of {list(NODE_TYPES)}")
+        x, y = position([record["x"], record["y"]], f"node {key!r}")
+        if grid.is_blocked(x, y):
+            fail(f"node {key!r} at ({x}, {y}) is an obstacle")
+        if (x, y) in taken:
+            fail(f"nodes {taken[(x, y)]!r} and {key!r} share ({x}, {y})")
+        taken[(x, y)] = key
+        nodes[key] = {"x": x, "y": y, NODE_FLAGS[record["type"]]: False, "type": record["type"]}
+    types = [record["type"] for record in nodes.values()]
+    if types.count("hub") != 1 or "node" not in types:
+        fail("a campaign needs exactly one hub and at least one node")
+
+    reachable = grid.reachable_from(start)
+    stranded = [key for key, record in nodes.items() if not reachable[record["x"] * cols + record["y"]]]
+    if stranded:
+        fail(f"cannot reach {stranded} from the start")
+
+    names = {}
+    for key, name in (data.get("names") or {}).items():
+        try:
+            x, y = (int(n) for n in key.split(","))
+        except ValueError:
+            fail(f"place name key {key!r} must look like \"row,column\"")
+        if not isinstance(name, str):
+            fail(f"place name for {key!r} must be a string")
+        names[position([x, y], f"place {name!r}")] = name
+
+    items = data.get("items", [])
+    if not (isinstance(items, list) and all(isinstance(item, str) for item in items)):
+        fail("'items' must be a list of strings")
+
+    story = data.get("story", {})
+    if not (isinstance(story, dict) and all(isinstance(text, str) for text in story.values())):
+        fail("'story' must map story parts to text")
+    unknown = set(story) - set(story_text())
+    if unknown:
+        fail(f"unknown story parts {sorted(unknown)} (expected some of {list(story_text())})")
+    help_override = data.get("help")
+    if help_override is not None and not isinstance(help_override, str):
+        fail("'help' must be a string")
+
+    return {
+        "title": data.get("title") or os.path.splitext(os.path.basename(path))[0],
+        "rows": rows,
+        "cols": cols,
+        "cells": bytes(grid.cells),
+        "start": start,
+        "nodes": nodes,
+        "names": names,
+        "items": items,
+        "story": story,
+        "help": help_override
+    }
+
+
+def main(argv=None):
+    """
+    python campaign.py [pack ...] validates and compiles content packs (all of campaigns/ by default).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    failed = False
+    for name in argv or available_campaigns():
+        try:
+            content = load_campaign(name)
+        except CampaignError as error:
+            print(error)
+            failed = True
+            continue
+        print(f"{name}: {content['title']}, {content['rows']}x{content['cols']}, "
+              f"{len(content['nodes'])} nodes, {len(content['names'])} named places")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+from operations import (display_map, move_player, hack_node_steps, bypass_drone)
+
+PAUSED = "paused" # a handler is waiting for the player's next line
+HISTORY_PAGE_SIZE = 20
+
+MOVE_DIRECTIONS = {
+    (-1, 0): "North",
+    (1, 0): "South",
+    (0, -1): "West",
+    (0, 1): "East"
+}
+
+
+class Arg:
+    """
+    One positional argument of a command: its name, allowed values and how to normalise it.
+    choices and error may also be functions of the game state, for values that depend on the campaign.
+    """
+    __slots__ = ("name", "choices", "optional", "normalize", "error")
+
+    def __init__(self, name, choices=None, optional=False, normalize=str.lower, error=None):
+        self.name = name
+        self.choices = choices
+        self.optional = optional
+        self.normalize = normalize
+        self.error = error # message shown when the value is not one of the choices
+
+
+class Command:
+    __slots__ = ("name", "handler", "aliases", "args", "usage", "ends_turn", "journaled", "undoable")
+
+    def __init__(self, name, handler, aliases=(), args=(), usage=None, ends_turn=True, journaled=True, undoable=True):
+        self.name = name
+        self.handler = handler
+        self.aliases = tuple(aliases)
+        self.args = tuple(args)
+        self.usage = usage or " ".join([name] + [f"<{arg.name}>" for arg in args])
+        self.ends_turn = ends_turn # whether NPCs and drones act after this command
+        self.journaled = journaled # whether it changes the game, so crash recovery has to replay it
+        self.undoable = undoable # whether the undo log records it (not undo/redo themselves)
+
+
+class CommandRouter:
+    """
+    Maps command words to handlers with a dict built at registration time, so looking up
+    a command (including its aliases and any unambiguous prefix) is a single dict access.
+    Handlers are called as handler(state, args) after their arguments have been validated.
+    Per-command latency is measured by profiler.Profiler, which names each step() through resolve().
+    """
+
+    def __init__(self):
+        self.commands = {}
+        self._lookup = {} # name, alias or prefix -> Command, or a tuple of names if ambiguous
+
+    def register(self, name, handler, aliases=(), args=(), usage=None, ends_turn=True, journaled=True, undoable=True):
+        command = Command(name, handler, aliases, args, usage, ends_turn, journaled, undoable)
+        self.commands[name] = command
+        self._rebuild_lookup()
+        return command
+
+    def command(self, name, **options):
+        """
+        Decorator form of register().
+        """
+        def decorator(handler):
+            self.register(name, handler, **options)
+            return handler
+        return decorator
+
+    def resolve(self, word):
+        """
+        Returns the Command for a word, a tuple of candidate names if the prefix is ambiguous, or None.
+        """
+        return self._lookup.get(word.lower())
+
+    def dispatch(self, state, line):
+        """
+        Parses and runs one command line. Returns (command, result); command is None
+        when nothing ran. A result of False means the arguments were rejected.
+        """
+        parts = line.strip().split()
+        if not parts:
+            return None, None
+
+        command = self.resolve(parts[0])
+        if command is None:
+            state.out("Unknown command. Type 'help' for a list of commands.")
+            state.emit("invalid", line)
+            return None, None
+        if isinstance(command, tuple):
+            state.out(f"Ambiguous command '{parts[0]}'. Did you mean: {', '.join(command)}?")
+            state.emit("invalid", line)
+            return None, None
+
+        args = self._parse_args(state, command, parts[1:])
+        if args is None:
+            state.emit("invalid", line)
+            return command, False
+
+        return command, command.handler(state, args)
+
+    def _parse_args(self, state, command, words):
+        values = []
+        for index, arg in enumerate(command.args):
+            if index >= len(words):
+                if arg.optional:
+                    values.append(None)
+                    continue
+                state.out(f"Usage: {command.usage}")
+                return None
+            value = arg.normalize(words[index])
+            choices = arg.choices(state) if callable(arg.choices) else arg.choices
+            if choices is not None and value not in choices:
+                error = arg.error(state) if callable(arg.error) else arg.error
+                state.out(error or f"Invalid {arg.name}. Use one of: {', '.join(choices)}.")
+                return None
+            values.append(value)
+        return values
+
+    def _rebuild_lookup(self):
+        words = {}
+        for command in self.commands.values():
+            for word in (command.name,) + command.aliases:
+                words[word] = command
+
+        lookup = {}
+        for word, command in words.items():
+            for end in range(1, len(word)):
+                prefix = word[:end]
+                found = lookup.get(prefix)
+                if found is None:
+                    lookup[prefix] = command
+                elif found is not command:
+                    names = found if isinstance(found, tuple) else (found.name,)
+                    if command.name not in names:
+                        lookup[prefix] = names + (command.name,)
+        lookup.update(words) # full names and aliases always win over prefixes
+        self._lookup = lookup
+
+
+# The game's commands. Other modules can add their own with @ROUTER.command(...).
+ROUTER = CommandRouter()
+
+
+@ROUTER.command("move", aliases=("go",), usage="move <direction> (north, south, east, west)",
+                args=[Arg("direction", ("north", "south", "east", "west"),
+                          error="Invalid direction. Please use north, south, east, or west.")])
+def move_command(state, args):
+    before = state.player_position
+    state.player_position = move_player(before, args[0], state.game_map, state.history, state.npc_queue,
+                                        state.drone_queue, state.location_names, out=state.out)
+    if state.player_position != before:
+        state.emit("moved", state.player_position)
+    else:
+        state.emit("blocked", args[0])
+    state.out(f"Current location: {state.location_names.get(state.player_position)}")
+
+
+@ROUTER.command("hack")
+def hack_command(state, args):
+    position = state.player_position
+    settings = state.settings
+    steps = hack_node_steps(position, state.node_locations, state.history, state.drone_queue,
+                            state.location_names, state.rng, settings["hack_attempts"],
+                            settings["alert_drones"], settings["hack_answers"])
+
+    def finish(success):
+        if success:
+            state.emit("hacked", state.node_locations.node_at(position))
+            if state.node_locations[state.hub_key]['unlocked']:
+                state.emit("unlocked", state.hub_key)
+        elif success is False:
+            state.emit("hack_failed", position)
+
+    return state.drive(steps, finish)
+
+
+def _step_count(state, args, verb):
+    # "undo" / "undo 3" / "undo all"; returns None (after a message) if the count is not a positive number
+    count = args[0]
+    if count is None:
+        return 1
+    if count == "all":
+        return state.undo_log.depth
+    if count.isdigit() and int(count) > 0:
+        return int(count)
+    state.out(f"Usage: {verb} [number of turns|all]")
+    return None
+
+
+@ROUTER.command("undo", usage="undo [n|all]", ends_turn=False, undoable=False, args=[Arg("count", optional=True)])
+def undo_command(state, args):
+    count = _step_count(state, args, "undo")
+    if count is None:
+        return False
+    done = state.undo_log.undo(state, count)
+    if not done:
+        state.out("You cannot do undo. There are no previous moves to revert to.")
+        return
+
+    location = state.location_names.get(state.player_position, 'Unknown Sector')
+    state.out(f"Reverted {done} turn{'s' if done > 1 else ''}. Current location: {location}")
+    state.history.append(f"Undid {done} turn{'s' if done > 1 else ''}, reverting to {location}")
+    state.emit("undo", state.player_position)
+
+
+@ROUTER.command("redo", usage="redo [n|all]", ends_turn=False, undoable=False, args=[Arg("count", optional=True)])
+def redo_command(state, args):
+    count = _step_count(state, args, "redo")
+    if count is None:
+        return False
+    done = state.undo_log.redo(state, count)
+    if not done:
+        state.out("Nothing to redo.")
+        return
+
+    location = state.location_names.get(state.player_position, 'Unknown Sector')
+    state.out(f"Restored {done} turn{'s' if done > 1 else ''}. Current location: {location}")
+    state.history.append(f"Redid {done} turn{'s' if done > 1 else ''}, returning to {location}")
+    state.emit("redo", state.player_position)
+
+
+@ROUTER.command("bypass", usage="bypass drone", args=[Arg("target", ("drone",), error="Usage: bypass drone")])
+def bypass_command(state, args):
+    if bypass_drone(state.inventory, state.drone_queue, out=state.out):
+        state.emit("bypassed", "Kumari Protocol Drone")
+
+
+@ROUTER.command("inventory", aliases=("inv",), ends_turn=False, journaled=False)
+def inventory_command(state, args):
+    state.out("\n--- Your Inventory ---")
+    state.out("- " + "\n- ".join(state.inventory) if state.inventory else "Inventory is empty.")
+    state.out("----------------------")
+
+
+@ROUTER.command("history", usage="history [page|all]", ends_turn=False, journaled=False,
+                args=[Arg("page", optional=True)])
+def history_command(state, args):
+    history = state.history
+    page = args[0]
+    state.out("\n--- Hacking History ---")
+    if page == "all":
+        history.display(out=state.out)
+    elif page and page.isdigit():
+        if not history.display(page=int(page), page_size=HISTORY_PAGE_SIZE, out=state.out):
+            state.out("No entries on that page.")
+    else:
+        history.display(last=HISTORY_PAGE_SIZE, out=state.out)
+        if len(history) > HISTORY_PAGE_SIZE:
+            state.out(f"(showing the last {HISTORY_PAGE_SIZE} of {len(history)} entries; use 'history <page>' or 'history all')")
+    state.out("-----------------------")
+
+
+@ROUTER.command("map", ends_turn=False, journaled=False)
+def map_command(state, args):
+    display_map(state.game_map, state.player_position, state.game_map, state.location_names, state.renderer,
+                out=state.out, markers=state.pursuers.markers())
+
+
+def _path_targets(state):
+    return state.node_locations.of_type("node")
+
+
+def _path_error(state):
+    targets = [f"'{key}' ({state.location_names.get(state.node_locations.position_of(key), key)})"
+               for key in _path_targets(state)]
+    return f"Invalid destination. Use {', '.join(targets[:-1])}{' or ' if len(targets) > 1 else ''}{targets[-1]}."
+
+
+@ROUTER.command("find_path", aliases=("path",), usage="find_path <location>", ends_turn=False,
+                args=[Arg("location", _path_targets, normalize=str.upper, error=_path_error)])
+def find_path_command(state, args):
+    location_names = state.location_names
+    start = state.player_position
+    end_loc = state.node_locations[args[0]]
+    end = (end_loc['x'], end_loc['y'])
+
+    path = state.path_cache.find_path(start, end) # read off the precomputed next-hop table
+
+    if not path:
+        state.out(f"\nNo path found from {location_names.get(start, 'Unknown Sector')} to {location_names[end]}. Try another route or check obstacles.")
+        return
+
+    state.out(f"\nPath from {location_names.get(start, 'Unknown Sector')} to {location_names[end]}:")
+    for i in range(1, len(path)):
+        prev = path[i-1]
+        curr = path[i]
+        move = (curr[0]-prev[0], curr[1]-prev[1])
+        direction = MOVE_DIRECTIONS.get(move, "Unknown")
+        sector_name = location_names.get(curr, "Unknown Sector")
+        state.out(f"-> {sector_name} ({direction})")
+
+    state.history.append(f"Found path to {location_names.get(end, 'Unknown Sector')}")
+
+
+@ROUTER.command("save", usage="save [file]", ends_turn=False, journaled=False, undoable=False, args=[Arg("file", optional=True, normalize=str)])
+def save_command(state, args):
+    from savegame import DEFAULT_SAVE_FILE, SaveError, save_game # imported here: savegame depends on the engine
+
+    path = args[0] or DEFAULT_SAVE_FILE
+    try:
+        size = save_game(state, path)
+    except (OSError, SaveError) as error:
+        state.out(f"Could not save the game: {error}")
+        return False
+    state.out(f"Game saved to {path} ({size} bytes).")
+
+
+@ROUTER.command("load", usage="load [file]", ends_turn=False, journaled=False, undoable=False, args=[Arg("file", optional=True, normalize=str)])
+def load_command(state, args):
+    from savegame import DEFAULT_SAVE_FILE, SaveError, restore
+
+    path = args[0] or DEFAULT_SAVE_FILE
+    try:
+        with open(path, "rb") as save_file:
+            restore(state, save_file.read())
+    except (OSError, SaveError) as error:
+        state.out(f"Could not load the game: {error}")
+        return False
+    if state.journal is not None:
+        state.journal.checkpoint() # the loaded game replaces everything journaled so far
+    state.out(f"Game loaded from {path}. Current location: {state.location_names.get(state.player_position, 'Unknown Sector')}")
+
+
+@ROUTER.command("help", ends_turn=False, journaled=False)
+def help_command(state, args):
+    state.out(state.help_text)
+
+    if state.final_ready:
+        state.out("\nFinal commands available: protocol <type>")
+
+
+@ROUTER.command("quit", aliases=("exit",), ends_turn=False)
+def quit_command(state, args):
+    state.out("Exiting 'The Last Protocol'. Goodbye!")
+    state.outcome = "quit"
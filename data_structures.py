@@ -1,38 +1,84 @@
+import threading
+
+
 class Node:
+    __slots__ = ("value", "next")
+
     def __init__(self, value):
         self.value = value 
         self.next = None
 
 class LinkedList:
-    def __init__(self, head=None):
+    """
+    Singly linked list used as the action history log.
+    A tail pointer keeps append O(1). When max_length is set the oldest
+    entries are dropped from the head once the log is full.
+    """
+
+    def __init__(self, head=None, max_length=None):
         self.head = head 
-        self.next = None
+        self.tail = head
+        self.length = 0
+        self.max_length = max_length
+        self.evicted = 0 # entries dropped from the front, keeps numbering stable
+
+        current = head
+        while current: # for a list that was handed a ready-made chain
+            self.tail = current
+            self.length += 1
+            current = current.next
     
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        current = self.head
+        while current:
+            yield current.value
+            current = current.next
+
     def append(self, value):
         new_node = Node(value)
 
         if not self.head: # for empty list
-            self.head = new_node
-            return 
-        
-        current = self.head
-        while current.next: # for finding the end of the list
-            current = current.next 
-
-        current.next = new_node # adding the new_node to the end of the list
+            self.head = self.tail = new_node
+        else:
+            self.tail.next = new_node # adding the new_node to the end of the list
+            self.tail = new_node
+        self.length += 1
 
+        if self.max_length is not None and self.length > self.max_length:
+            self.head = self.head.next # drop the oldest entry
+            self.length -= 1
+            self.evicted += 1
     
-    def display(self):
+    def display(self, last=None, page=None, page_size=20, out=print):
         """ 
-        Display all nodes of the list from start to fininsh 
+        Display nodes of the list from start to fininsh.
+        last=n shows only the newest n entries; page=k shows the k-th page (1-based) of page_size entries.
+        Returns the number of entries printed.
         """
-        
+        if last is not None:
+            start = max(self.length - last, 0)
+            stop = self.length
+        elif page is not None:
+            start = (page - 1) * page_size
+            stop = min(start + page_size, self.length)
+        else:
+            start, stop = 0, self.length
+
+        lines = []
         current = self.head 
-        count = 1
-        while current:
-            print(f"{count}. {current.value}")
+        index = 0
+        while current and index < stop:
+            if index >= start:
+                lines.append(f"{self.evicted + index + 1}. {current.value}")
             current = current.next 
-            count += 1
+            index += 1
+
+        if lines:
+            out("\n".join(lines))
+        return len(lines)
 
 class Stack:
     """
@@ -61,70 +107,277 @@ class Stack:
 class Queue:
     """
     For managing NPC Actions.
-    A Deque (double-ended queue) is used to avoid the performance cost of inserting at the start of a list.
+    A ring buffer (fixed array plus head/tail indexes) gives O(1) enqueue and dequeue.
+    Unbounded queues double their array when full; bounded queues drop the oldest item instead.
     """
-    
-    def __init__(self):
-        self.items = []
+    __slots__ = ("_buffer", "_head", "_size", "bounded", "dropped")
+
+    def __init__(self, capacity=16, bounded=False):
+        if capacity < 1:
+            raise ValueError("Queue capacity must be at least 1")
+        self._buffer = [None] * capacity
+        self._head = 0 # index of the oldest item
+        self._size = 0
+        self.bounded = bounded
+        self.dropped = 0 # items discarded by a bounded queue
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        """
+        Iterates from the oldest to the newest item without removing anything.
+        """
+        buffer = self._buffer
+        capacity = len(buffer)
+        for i in range(self._size):
+            yield buffer[(self._head + i) % capacity]
+
+    @property
+    def capacity(self):
+        return len(self._buffer)
 
     def enqueue(self, item):
-        self.items.insert(0, item)
+        capacity = len(self._buffer)
+        if self._size == capacity:
+            if self.bounded:
+                # Overwrite the oldest slot and move the head past it.
+                self._buffer[self._head] = item
+                self._head = (self._head + 1) % capacity
+                self.dropped += 1
+                return
+            self._grow()
+            capacity = len(self._buffer)
+        self._buffer[(self._head + self._size) % capacity] = item
+        self._size += 1
+
+    def enqueue_many(self, items):
+        for item in items:
+            self.enqueue(item)
 
     def is_empty(self):
-        return len(self.items) == 0
+        return self._size == 0
 
     def dequeue(self):
-        if not self.is_empty():
-            return self.items.pop()
-        return None 
-    
+        if self._size == 0:
+            return None
+        item = self._buffer[self._head]
+        self._buffer[self._head] = None # release the reference
+        self._head = (self._head + 1) % len(self._buffer)
+        self._size -= 1
+        return item
+
+    def drain(self, n=None):
+        """
+        Removes and returns up to n of the oldest items (all of them if n is None).
+        """
+        count = self._size if n is None else min(n, self._size)
+        return [self.dequeue() for _ in range(count)]
+
+    def _grow(self):
+        self._buffer = list(self) + [None] * len(self._buffer)
+        self._head = 0
+
+class _HeapEntry:
+    """
+    A single slot in the PriorityQueue heap. Returned to callers as a handle
+    so they can later change its priority or remove it.
+    """
+    __slots__ = ("priority", "order", "value", "index")
+
+    def __init__(self, priority, order, value):
+        self.priority = priority
+        self.order = order # arrival counter, keeps equal priorities FIFO
+        self.value = value
+        self.index = -1 # position in the heap, -1 once removed
+
+    def __lt__(self, other):
+        if self.priority != other.priority:
+            return self.priority < other.priority
+        return self.order < other.order
+
+    def __repr__(self):
+        return f"_HeapEntry(priority={self.priority}, value={self.value!r})"
+
+
 class PriorityQueue:
     """
     A priority queue for urgent drone threats. Lower number = higher priority.
-    This implementation uses a simple list and manual searching.
+    Backed by a binary min-heap, so enqueue/dequeue are O(log n) and peek is O(1).
+    Items with the same priority come out in the order they were added.
+
+    When the queue is full the overflow policy decides what happens:
+        "reject"       - the new item is dropped and enqueue returns None
+        "evict_lowest" - the least urgent item is dropped to make room
+        "block"        - enqueue waits up to `timeout` seconds for another thread to make room
+
+    Every change to the heap happens under one lock, so producers and consumers may
+    share a queue across threads. "block" needs a timeout: with a single thread nothing
+    can ever make room, and waiting forever would hang the game.
     """
 
-    def __init__(self):
-        self._items = []
-        self.max_size = 5  # Added limit to prevent flooding
+    REJECT = "reject"
+    EVICT_LOWEST = "evict_lowest"
+    BLOCK = "block"
+
+    def __init__(self, max_size=5, overflow="reject", timeout=None):
+        if overflow not in (self.REJECT, self.EVICT_LOWEST, self.BLOCK):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if overflow == self.BLOCK and timeout is None:
+            raise ValueError("The block policy needs a timeout")
+        self._heap = []
+        self._counter = 0
+        self.max_size = max_size # None means unbounded
+        self.overflow = overflow
+        self.timeout = timeout # only used by the "block" policy
+        self._not_full = threading.Condition() # guards _heap and the handles' indexes (an RLock underneath)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def is_empty(self):
+        return len(self._heap) == 0
+
+    def is_full(self):
+        return self.max_size is not None and len(self._heap) >= self.max_size
 
     def enqueue(self, value, priority):
         """
-        Adds an item with priority to the queue, if not exceeding max size.
+        Adds an item with priority to the queue.
+        Returns a handle for update_priority()/remove(), or None if the item was rejected.
         """
-        if len(self._items) >= self.max_size:
-            print("Drone queue is full; cannot add more threats.")
-            return
-        self._items.append((priority, value))
+        with self._not_full:
+            if self.is_full():
+                if self.overflow == self.REJECT:
+                    return None
+                if self.overflow == self.BLOCK:
+                    # wait_for releases the lock while waiting and holds it again when it returns
+                    if not self._not_full.wait_for(lambda: not self.is_full(), self.timeout):
+                        return None
+                else:
+                    lowest = self._lowest_entry()
+                    if lowest is None or not priority < lowest.priority:
+                        return None # the new threat is no more urgent than anything queued
+                    self._remove_at(lowest.index)
 
-    def is_empty(self):
-        return len(self._items) == 0
+            entry = _HeapEntry(priority, self._counter, value)
+            self._counter += 1
+            entry.index = len(self._heap)
+            self._heap.append(entry)
+            self._sift_up(entry.index)
+            return entry
 
     def dequeue(self):
         """
         Removes and returns the highest priority item.
         """
-        if self.is_empty():
-            return None
-        
-        highest_priority_index = 0
-
-        for i in range(1, len(self._items)):
-            if self._items[i][0] < self._items[highest_priority_index][0]:
-                highest_priority_index = i
+        with self._not_full:
+            if self.is_empty():
+                return None
+            return self._remove_at(0).value
 
-        return self._items.pop(highest_priority_index)[1]
-    
     def peek(self):
         """
         Returns the highest priority item without removing it
         """
-        if self.is_empty():
-            return None 
-        
-        highest_priority_index = 0
-        for i in range(1, len(self._items)):
-            if self._items[i][0] < self._items[highest_priority_index][0]:
-                highest_priority_index = i
-        
-        return self._items[highest_priority_index][1]
\ No newline at end of file
+        with self._not_full:
+            if self.is_empty():
+                return None
+            return self._heap[0].value
+
+    def items(self):
+        """
+        Returns (priority, value) pairs in the order they were added.
+        Re-enqueueing them in this order rebuilds an equivalent queue.
+        """
+        with self._not_full:
+            return [(entry.priority, entry.value) for entry in sorted(self._heap, key=lambda entry: entry.order)]
+
+    def update_priority(self, handle, priority):
+        """
+        Changes the priority of a queued item (decrease-key or increase-key).
+        Returns False if the handle is no longer in the queue.
+        """
+        with self._not_full:
+            if not self._owns(handle):
+                return False
+            old_priority = handle.priority
+            handle.priority = priority
+            if priority < old_priority:
+                self._sift_up(handle.index)
+            else:
+                self._sift_down(handle.index)
+            return True
+
+    def remove(self, handle):
+        """
+        Removes a queued item by its handle and returns its value, or None if it is gone already.
+        """
+        with self._not_full:
+            if not self._owns(handle):
+                return None
+            return self._remove_at(handle.index).value
+
+    def _owns(self, handle):
+        return 0 <= handle.index < len(self._heap) and self._heap[handle.index] is handle
+
+    def _lowest_entry(self):
+        # The least urgent entry is always a leaf, so only the second half is scanned.
+        heap = self._heap
+        if not heap:
+            return None
+        lowest = heap[len(heap) // 2]
+        for i in range(len(heap) // 2 + 1, len(heap)):
+            if lowest < heap[i]:
+                lowest = heap[i]
+        return lowest
+
+    def _remove_at(self, index):
+        # Callers hold the lock
+        heap = self._heap
+        entry = heap[index]
+        last = heap.pop()
+        if last is not entry:
+            heap[index] = last
+            last.index = index
+            if index > 0 and last < heap[(index - 1) // 2]:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+        entry.index = -1
+        self._not_full.notify() # a blocked producer can go ahead
+        return entry
+
+    def _sift_up(self, index):
+        heap = self._heap
+        entry = heap[index]
+        while index > 0:
+            parent_index = (index - 1) // 2
+            parent = heap[parent_index]
+            if not entry < parent:
+                break
+            heap[index] = parent
+            parent.index = index
+            index = parent_index
+        heap[index] = entry
+        entry.index = index
+
+    def _sift_down(self, index):
+        heap = self._heap
+        size = len(heap)
+        entry = heap[index]
+        while True:
+            child_index = 2 * index + 1
+            if child_index >= size:
+                break
+            right_index = child_index + 1
+            if right_index < size and heap[right_index] < heap[child_index]:
+                child_index = right_index
+            child = heap[child_index]
+            if not child < entry:
+                break
+            heap[index] = child
+            child.index = index
+            index = child_index
+        heap[index] = entry
+        entry.index = index
@@ -0,0 +1,381 @@
+import argparse, random, time
+from collections import Counter, deque
+
+from campaign import DEFAULT_CAMPAIGN, campaign_city, load_campaign
+from data_structures import LinkedList, Queue, PriorityQueue
+from grid import generate_city, parse_city_size
+from commands import PAUSED, ROUTER
+from operations import (HISTORY_RETENTION, HACK_PATHS, answer_options, final_protocol_steps, handle_npc_crowd, handle_drone_patrol)
+from locations import LocationRegistry
+from pathfinding import path_finder
+from pursuit import Pursuers
+from renderer import MapRenderer
+from undo import UndoLog
+
+DIRECTIONS = {(-1, 0): "north", (1, 0): "south", (0, -1): "west", (0, 1): "east"}
+
+# Balance knobs; simulate.py sweeps these
+DEFAULT_SETTINGS = {
+    "hack_attempts": 3,        # guesses per hacking minigame
+    "hack_answers": HACK_PATHS, # possible answers in the minigame
+    "npc_spawn_chance": 1/3,   # chance of a new NPC crowd each turn
+    "alert_drones": 1,         # drones called in by a failed hack
+    "drone_capacity": 5,       # size of the drone priority queue
+    "undo_depth": 100          # turns kept for undo/redo (0 turns undo off)
+}
+
+
+class GameState:
+    """
+    Everything one game needs, bundled so it can run without a terminal.
+    step() takes a command line, dispatches it through the command router
+    and returns what happened as a list of (kind, data) events.
+
+    Output goes to `out` if given (main.py passes print), otherwise it is captured as
+    ("output", text) events. A prompt with no queued answer is answered by `read` if given;
+    with interactive=True it pauses the command instead (a ("prompt", text) event is
+    returned and the next step() line answers it); otherwise it reads as empty input.
+
+    `campaign` names the content pack (see campaign.load_campaign) for the story, starting
+    items, help and, unless `city` is given, the map.
+    """
+
+    def __init__(self, seed=None, city=None, capture_output=True, settings=None, interactive=False,
+                 out=None, read=None, router=None, precompute_paths=True, campaign=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        answer_options(self.settings["hack_answers"]) # an empty answer set fails here, not mid-hack
+        self.router = router or ROUTER
+
+        # The content pack supplies the story, items and help, and the city unless one is given
+        content = load_campaign(campaign)
+        self.campaign = campaign or DEFAULT_CAMPAIGN
+        game_map, player_position, node_locations, location_names = city or campaign_city(content)
+        self.game_map = game_map
+        self.player_position = player_position
+        self.node_locations = LocationRegistry(node_locations, location_names)
+        self.location_names = self.node_locations.names
+        self.hub_key = self.node_locations.hub()
+        self.hub_position = self.node_locations.position_of(self.hub_key)
+        # Whole-map next-hop tables, precomputed for every location unless asked not to;
+        # very large maps get a hierarchical pathfinder instead
+        self.path_cache = path_finder(game_map, self.node_locations if precompute_paths else None)
+
+        self.title = content["title"]
+        self.story_text = content["story"]
+        self.help_text = content["help"]
+        self.inventory = list(content["items"])
+        self.history = LinkedList(max_length=HISTORY_RETENTION)
+        self.undo_log = UndoLog(self.settings["undo_depth"])
+        self.npc_queue = Queue(capacity=8, bounded=True) # old crowds disperse rather than piling up
+        self.drone_queue = PriorityQueue(max_size=self.settings["drone_capacity"])
+        self.pursuers = Pursuers(game_map) # where those crowds and drones are on the map
+        # Per game, so each player's row cache follows their own window
+        self.renderer = MapRenderer(title=self.title, places=self.node_locations.legend(game_map))
+
+        self.turns = 0
+        self.outcome = None # "good", "bad", "aborted" or "quit" once the game is over
+        self.final_ready = False # unlocked hub reached; the next line goes to the final protocol
+        self.capture_output = capture_output
+        self.interactive = interactive
+
+        self._write = out
+        self._reader = read
+        self._events = []
+        self._answers = deque()
+        self._pending = None # (prompt generator, finish callback) while a command waits for input
+        self._consumed = [] # answers used by the current command, for the journal
+        self._undo_before = None # undo snapshot of a command still waiting for input
+        self.journal = None # a journal.Journal recording this game, if any
+
+    @classmethod
+    def generated(cls, rows, cols, seed=None, **kwargs):
+        """
+        A game on a procedurally generated city; the same seed drives the map and the game.
+        """
+        return cls(seed=seed, city=generate_city(rows, cols, seed=seed), **kwargs)
+
+    @property
+    def game_over(self):
+        return self.outcome is not None
+
+    @property
+    def awaiting_input(self):
+        return self._pending is not None
+
+    def at_final_hub(self):
+        return self.node_locations[self.hub_key]['unlocked'] and self.player_position == self.hub_position
+
+    def step(self, command, answers=()):
+        """
+        Runs one command line and returns a list of (kind, data) events.
+        `answers` feeds the prompts the command raises (hacking guesses, protocol
+        steps, confirmations) before falling back to `read`.
+        If a journal is attached, a line that changed the game is recorded with the answers it used.
+        """
+        self._events = events = []
+        self._consumed = []
+        if self.game_over:
+            events.append(("invalid", "the game is over"))
+            return events
+        self._answers = deque(answers)
+
+        if self._run(command) and self.journal is not None:
+            self.journal.record(command, self._consumed)
+        return events
+
+    def _run(self, command):
+        # Returns True if the command changed the game
+        if self._pending:
+            steps, finish = self._pending
+            self._pending = None
+            if self.drive(steps, finish, command) != PAUSED and not self.game_over:
+                self._end_turn()
+                if self._undo_before is not None:
+                    self.undo_log.record(self, self._undo_before)
+            return True
+
+        if not command.strip():
+            return False
+
+        if self.final_ready:
+            # The interactive game hands the next input to final_protocol, so the command becomes its first answer.
+            self._answers.appendleft(command)
+            steps = final_protocol_steps(self.player_position, self.node_locations, self.history, self.story_text)
+            self.drive(steps, self._finish_protocol)
+            del self._consumed[:1] # the command itself, which the journal stores separately
+            return True
+
+        before = self.undo_log.capture(self) if self.undo_log.depth else None # undo_depth 0 turns undo off
+        handled, result = self.router.dispatch(self, command)
+        if handled is None or result is False:
+            return False # nothing ran, or a usage error
+        if result == PAUSED:
+            self._undo_before = before # the turn ends, and is recorded, once the command finishes
+            return handled.journaled
+        if handled.ends_turn:
+            self._end_turn()
+        if handled.undoable and before is not None and not self.game_over:
+            self.undo_log.record(self, before)
+        return handled.journaled
+
+    def _finish_protocol(self, outcome):
+        self.outcome = outcome or "aborted"
+        self.emit("ending", self.outcome)
+
+    def out(self, *values):
+        if self._write is not None:
+            self._write(*values)
+        elif self.capture_output:
+            self._events.append(("output", " ".join(str(value) for value in values)))
+
+    def emit(self, kind, data):
+        self._events.append((kind, data))
+
+    def drive(self, steps, finish, reply=None):
+        """
+        Runs a prompt generator (see operations.run_prompts), answering from the queued answers.
+        Returns PAUSED if it stopped at an unanswered prompt in interactive mode,
+        otherwise whatever finish() returns for the generator's result.
+        """
+        try:
+            while True:
+                kind, text = steps.send(reply)
+                reply = None
+                if kind == "say":
+                    self.out(text)
+                elif self._answers:
+                    reply = self._answers.popleft()
+                    self._consumed.append(reply)
+                elif self.interactive:
+                    self._pending = (steps, finish)
+                    self._events.append(("prompt", text))
+                    return PAUSED
+                else:
+                    reply = self._read(text)
+        except StopIteration as finished:
+            return finish(finished.value)
+
+    def _end_turn(self):
+        # World updates after every command that takes game time
+        handle_npc_crowd(self.npc_queue, self.rng, self.settings["npc_spawn_chance"])
+        self.pursuers.update(self.npc_queue, self.drone_queue, self.player_position)
+        handle_drone_patrol(self.drone_queue, self.out, self.pursuers.distance_to("Kumari Protocol Drone"))
+        self.turns += 1
+        self.final_ready = self.at_final_hub()
+
+    def _read(self, prompt=""):
+        if self._answers:
+            answer = self._answers.popleft()
+        else:
+            answer = self._reader(prompt) if self._reader else ""
+        self._consumed.append(answer)
+        return answer
+
+
+def greedy_policy(state, rng):
+    """
+    Walks the shortest path to the nearest unhacked node, hacks it with random guesses,
+    bypasses pursuing drones while the VPN lasts, then heads for the hub.
+    Returns (command, answers).
+    """
+    if state.final_ready:
+        if rng.random() < 0.8:
+            return "protocol containment", ["next"] * 3
+        return "protocol obliteration", ["yes"]
+
+    if state.drone_queue.peek() == "Kumari Protocol Drone" and "VPN_app" in state.inventory:
+        return "bypass drone", ()
+
+    position = state.player_position
+    locations = state.node_locations
+    targets = [locations.position_of(key) for key in locations.of_type('node') if not locations[key]['hacked']]
+    if position in targets:
+        return "hack", [rng.choice(state.settings["hack_answers"]) for _ in range(state.settings["hack_attempts"])]
+    if not targets:
+        targets = [state.hub_position]
+
+    paths = [state.path_cache.find_path(position, target) for target in targets]
+    paths = [path for path in paths if path]
+    if not paths:
+        return random_policy(state, rng)
+    step_to = min(paths, key=len)[1]
+    return "move " + DIRECTIONS[(step_to[0] - position[0], step_to[1] - position[1])], ()
+
+
+def random_policy(state, rng):
+    """
+    Picks uniformly among the commands that make sense right now.
+    """
+    if state.final_ready:
+        return rng.choice([("protocol containment", ["next"] * 3), ("protocol obliteration", ["yes"])])
+
+    commands = ["move " + direction for direction in DIRECTIONS.values()] + ["undo"]
+    if state.node_locations.node_at(state.player_position):
+        commands.append("hack")
+    if not state.drone_queue.is_empty():
+        commands.append("bypass drone")
+
+    command = rng.choice(commands)
+    if command == "hack":
+        return command, [rng.choice(state.settings["hack_answers"]) for _ in range(state.settings["hack_attempts"])]
+    return command, ()
+
+
+def scripted_policy(lines):
+    """
+    Replays a fixed list of lines of the form "command | answer answer ...".
+    The game stops when the script runs out; every new game starts it from the top.
+    """
+    script = []
+    for line in lines:
+        command, _, answers = line.partition("|")
+        if command.strip():
+            script.append((command.strip(), answers.split()))
+    playing = [None, 0] # the game being played and the next line for it
+
+    def policy(state, rng):
+        if playing[0] is not state:
+            playing[:] = [state, 0]
+        if playing[1] >= len(script):
+            return None
+        playing[1] += 1
+        return script[playing[1] - 1]
+
+    return policy
+
+
+POLICIES = {"greedy": greedy_policy, "random": random_policy}
+
+
+def play(state, policy, max_turns=500, seed=None):
+    """
+    Plays one game to the end (or max_turns) and returns a summary dict.
+    """
+    rng = random.Random(f"policy-{seed}")
+    hacks = hack_failures = 0
+    while not state.game_over and state.turns < max_turns:
+        move = policy(state, rng)
+        if move is None:
+            break
+        command, answers = move
+        for kind, _ in state.step(command, answers):
+            if kind == "hacked":
+                hacks += 1
+            elif kind == "hack_failed":
+                hack_failures += 1
+
+    return {
+        "seed": state.seed,
+        "outcome": state.outcome or "timeout",
+        "turns": state.turns,
+        "vpn_used": "VPN_app" not in state.inventory,
+        "hacks": hacks,
+        "hack_failures": hack_failures
+    }
+
+
+def run_batch(games, seed=0, policy=greedy_policy, max_turns=500, city_size=None):
+    """
+    Plays `games` headless games with seeds seed, seed+1, ... and aggregates the results.
+    """
+    outcomes = Counter()
+    total_turns = 0
+    vpn_used = 0
+    started = time.perf_counter()
+
+    for game_seed in range(seed, seed + games):
+        if city_size:
+            state = GameState.generated(*city_size, seed=game_seed, capture_output=False)
+        else:
+            state = GameState(seed=game_seed, capture_output=False)
+        result = play(state, policy, max_turns, game_seed)
+        outcomes[result["outcome"]] += 1
+        total_turns += result["turns"]
+        vpn_used += result["vpn_used"]
+
+    elapsed = time.perf_counter() - started
+    return {
+        "games": games,
+        "outcomes": dict(outcomes),
+        "win_rate": outcomes["good"] / games,
+        "lose_rate": outcomes["bad"] / games,
+        "mean_turns": total_turns / games,
+        "vpn_used_rate": vpn_used / games,
+        "seconds": elapsed,
+        "games_per_second": games / elapsed if elapsed else float("inf")
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run headless games of The Last Protocol")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--script", help="file of 'command | answers' lines to replay instead of a policy")
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--city", metavar="ROWSxCOLS", help="play on generated cities of this size")
+    options = parser.parse_args(argv)
+    if options.games < 1:
+        parser.error("--games must be at least 1")
+
+    policy = POLICIES[options.policy]
+    if options.script:
+        with open(options.script) as script_file:
+            policy = scripted_policy(script_file.read().splitlines())
+    try:
+        city_size = parse_city_size(options.city) if options.city else None
+    except ValueError as error:
+        parser.error(f"--city {options.city}: {error}")
+
+    summary = run_batch(options.games, options.seed, policy, options.max_turns, city_size)
+    print(f"Games played:   {summary['games']} in {summary['seconds']:.2f}s ({summary['games_per_second']:.0f} games/s)")
+    for outcome, count in sorted(summary["outcomes"].items()):
+        print(f"  {outcome:<10} {count:>8}  ({count / summary['games']:.1%})")
+    print(f"Mean turns:     {summary['mean_turns']:.1f}")
+    print(f"VPN_app used:   {summary['vpn_used_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
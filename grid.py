@@ -0,0 +1,202 @@
+import random
+from collections import deque
+
+OBSTACLE = ord('X')
+EMPTY = ord('.')
+_OPEN_BITS = bytes(ord("0") if code == OBSTACLE else ord("1") for code in range(256)) # obstacle -> "0", anything else -> "1"
+
+NODE_NAMES = {
+    "L": "Lazimpat (Your Base)",
+    "T": "Thamel Network Node",
+    "B": "Baneshwor Node",
+    "D": "Durbar Square Node",
+    "H": "Patan Data Hub (Final Mission)"
+}
+
+
+class Grid:
+    """
+    The city map stored as one byte per cell in a row-major bytearray.
+    Positions are (x, y) = (row, column), the same as the rest of the game.
+    `version` goes up whenever the obstacle layout changes so caches can tell when to rebuild.
+    """
+    __slots__ = ("rows", "cols", "cells", "version")
+
+    def __init__(self, rows, cols, fill='.'):
+        self.rows = rows
+        self.cols = cols
+        self.cells = bytearray(fill.encode()) * (rows * cols)
+        self.version = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a grid from a list of rows, each a string or a list of one-character cells.
+        """
+        grid = cls(len(rows), len(rows[0]))
+        grid.cells = bytearray(''.join(''.join(row) for row in rows).encode())
+        return grid
+
+    def copy(self):
+        grid = Grid(0, 0)
+        grid.rows, grid.cols = self.rows, self.cols
+        grid.cells = bytearray(self.cells)
+        return grid
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, position):
+        return chr(self.cells[position[0] * self.cols + position[1]])
+
+    def __setitem__(self, position, value):
+        index = position[0] * self.cols + position[1]
+        code = ord(value)
+        if (self.cells[index] == OBSTACLE) != (code == OBSTACLE):
+            self.version += 1
+        self.cells[index] = code
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.rows and 0 <= y < self.cols
+
+    def is_blocked(self, x, y):
+        return self.cells[x * self.cols + y] == OBSTACLE
+
+    def row_string(self, x, start=0, stop=None):
+        """
+        Returns row x (optionally the column slice start:stop) as a string.
+        """
+        offset = x * self.cols
+        stop = self.cols if stop is None else stop
+        return self.cells[offset + start:offset + stop].decode()
+
+    def rows_as_strings(self):
+        return [self.row_string(x) for x in range(self.rows)]
+
+    def open_mask(self, top, bottom, left, right):
+        """
+        The open cells of rows top:bottom, columns left:right as a bitmask in a Python int,
+        laid out row-major with a spare 0 bit after each row, so cell (x, y) is bit
+        (x - top) * (right - left + 1) + y - left and a sideways shift never wraps onto the next row.
+        """
+        cols, cells = self.cols, self.cells
+        bits = b"".join(cells[x * cols + left:x * cols + right].translate(_OPEN_BITS) + b"0"
+                        for x in range(top, bottom))
+        return int(bits[::-1], 2) if bits else 0
+
+    def reachable_from(self, position):
+        """
+        Returns a bytearray flag per cell marking everything reachable from position.
+        """
+        cols, cells = self.cols, self.cells
+        seen = bytearray(self.rows * cols)
+        start = position[0] * cols + position[1]
+        seen[start] = 1
+        frontier = deque([start])
+
+        while frontier:
+            index = frontier.popleft()
+            x, y = divmod(index, cols)
+            for neighbour, ok in ((index - cols, x > 0), (index + cols, x < self.rows - 1),
+                                  (index - 1, y > 0), (index + 1, y < cols - 1)):
+                if ok and not seen[neighbour] and cells[neighbour] != OBSTACLE:
+                    seen[neighbour] = 1
+                    frontier.append(neighbour)
+        return seen
+
+
+def wavefronts(start, open_cells, stride):
+    """
+    Breadth-first search on bitmasks laid out like Grid.open_mask (`stride` is the window
+    width plus one): yields `start`, then every open cell one move from it, then two moves,
+    and so on, a whole wavefront per step, until nothing new is reached.
+    """
+    frontier = seen = start
+    while frontier:
+        yield frontier
+        frontier = (frontier << 1 | frontier >> 1 | frontier << stride | frontier >> stride) & open_cells & ~seen
+        seen |= frontier
+
+
+def step_into(wavefront, position, window):
+    """
+    The first neighbour of position (west, east, north, south) inside the
+    (top, bottom, left, right) window whose bit is set in wavefront, or None.
+    """
+    top, bottom, left, right = window
+    stride = right - left + 1
+    x, y = position
+    for nx, ny in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+        if top <= nx < bottom and left <= ny < right and wavefront >> ((nx - top) * stride + ny - left) & 1:
+            return nx, ny
+    return None
+
+
+def generate_city(rows, cols, seed=None, obstacle_density=0.2):
+    """
+    Procedurally generates a city grid with the base (L), the three nodes (T, B, D) and the hub (H).
+    Obstacles are scattered at random, then a corridor is carved from the base to any
+    location that ended up walled off, so every location is always reachable.
+    Returns (grid, start_position, node_locations, location_names).
+    """
+    check_city_size(rows, cols)
+
+    rng = random.Random(seed)
+    grid = Grid(rows, cols)
+    grid.cells = bytearray(rng.choices((OBSTACLE, EMPTY), (obstacle_density, 1 - obstacle_density), k=rows * cols))
+
+    positions = {}
+    for index, key in zip(rng.sample(range(rows * cols), len(NODE_NAMES)), NODE_NAMES):
+        positions[key] = divmod(index, cols)
+        grid.cells[index] = ord(key)
+
+    start = positions["L"]
+    reachable = grid.reachable_from(start)
+    for key, (x, y) in positions.items():
+        if not reachable[x * cols + y]:
+            _carve_corridor(grid, start, (x, y))
+
+    node_locations = {}
+    for key in ("T", "B", "D"):
+        x, y = positions[key]
+        node_locations[key] = {"x": x, "y": y, "hacked": False, "type": "node"}
+    x, y = positions["H"]
+    node_locations["H"] = {"x": x, "y": y, "unlocked": False, "type": "hub"}
+
+    location_names = {positions[key]: name for key, name in NODE_NAMES.items()}
+    return grid, start, node_locations, location_names
+
+
+def check_city_size(rows, cols):
+    """
+    Raises ValueError unless generate_city can build a rows x cols city.
+    """
+    if rows < 1 or cols < 1:
+        raise ValueError("City needs at least one row and one column")
+    if rows * cols < len(NODE_NAMES):
+        raise ValueError("City is too small to hold every location")
+
+
+def parse_city_size(text):
+    """
+    Turns a --city value like "200x300" into (rows, cols), raising ValueError
+    if it is malformed or too small to generate.
+    """
+    try:
+        rows, cols = (int(n) for n in text.lower().split("x"))
+    except ValueError:
+        raise ValueError("must look like ROWSxCOLS, e.g. 200x300")
+    check_city_size(rows, cols)
+    return rows, cols
+
+
+def _carve_corridor(grid, start, end):
+    # Walk along the row, then along the column, clearing obstacles on the way.
+    x, y = start
+    while (x, y) != end:
+        if y != end[1]:
+            y += 1 if end[1] > y else -1
+        else:
+            x += 1 if end[0] > x else -1
+        if grid.is_blocked(x, y):
+            grid[x, y] = '.'
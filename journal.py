@@ -0,0 +1,177 @@
+import json, os, struct, time, zlib
+
+from savegame import dumps, loads
+
+RECORD_HEADER = struct.Struct("<II") # payload length, crc32 of payload
+CHECKPOINT_MAGIC = b"TLPC"
+CHECKPOINT_HEADER = struct.Struct("<4sQ") # magic, sequence number of the last record it includes
+
+
+class Journal:
+    """
+    Append-only log of every state-changing command, for crash recovery.
+
+    Each record is the command line plus the answers it consumed (hacking guesses,
+    protocol steps). Because a game is deterministic given its RNG state, replaying
+    the records on top of a snapshot rebuilds the exact state.
+
+    Records are buffered and written + fsynced in batches: once `sync_every` records
+    are waiting, or when a record arrives `sync_interval` seconds or more after the
+    last sync. Nothing runs in between, so a batch left by a game that then goes idle
+    stays unsynced until the next record, sync() or close(); a crash loses at most
+    that one batch. main.py uses sync_every=1, so an interactive game never waits.
+    Every `checkpoint_every` records a snapshot is written atomically and the
+    journal is started afresh, which keeps recovery time bounded.
+
+    Files: <base>.ckpt (latest snapshot) and <base>.journal (records since then).
+    """
+
+    def __init__(self, base_path, sync_every=32, sync_interval=1.0, checkpoint_every=1000):
+        self.checkpoint_path = base_path + ".ckpt"
+        self.journal_path = base_path + ".journal"
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.checkpoint_every = checkpoint_every
+
+        self.sequence = 0 # number of the last record written
+        self._since_checkpoint = 0
+        self._buffer = []
+        self._last_sync = time.monotonic()
+        self._file = None
+        self._state = None
+
+    def exists(self):
+        return os.path.exists(self.checkpoint_path)
+
+    def attach(self, state):
+        """
+        Starts journaling a game: writes its current state as the first checkpoint.
+        """
+        self._state = state
+        state.journal = self
+        self.checkpoint()
+
+    def record(self, command, answers=()):
+        self.sequence += 1
+        self._buffer.append(_encode(self.sequence, command, answers))
+        self._since_checkpoint += 1
+
+        if len(self._buffer) >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        if self._since_checkpoint >= self.checkpoint_every and not self._state.awaiting_input:
+            self.checkpoint()
+
+    def sync(self):
+        """
+        Writes buffered records and fsyncs them in one go.
+        """
+        if self._buffer:
+            if self._file is None:
+                self._file = open(self.journal_path, "ab")
+            self._file.write(b"".join(self._buffer))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer.clear()
+        self._last_sync = time.monotonic()
+
+    def checkpoint(self):
+        """
+        Snapshots the attached game and starts an empty journal after it.
+        The snapshot is written to a temporary file and renamed, so a crash never
+        leaves a half-written checkpoint behind.
+        """
+        self.sync()
+        data = CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, self.sequence) + dumps(self._state)
+        temporary = self.checkpoint_path + ".tmp"
+        with open(temporary, "wb") as checkpoint_file:
+            checkpoint_file.write(data)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary, self.checkpoint_path)
+
+        # Records up to self.sequence are now in the checkpoint
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, "wb")
+        self._since_checkpoint = 0
+
+    def close(self):
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def recover(self, **state_options):
+        """
+        Rebuilds the game from the latest checkpoint plus the journal tail and keeps
+        journaling it. A torn or corrupt record at the end (a crash mid-write) ends the replay.
+        Returns the recovered GameState.
+        """
+        with open(self.checkpoint_path, "rb") as checkpoint_file:
+            data = checkpoint_file.read()
+        magic, sequence = CHECKPOINT_HEADER.unpack_from(data)
+        if magic != CHECKPOINT_MAGIC:
+            raise ValueError(f"{self.checkpoint_path} is not a journal checkpoint")
+        state = loads(data[CHECKPOINT_HEADER.size:], **state_options)
+
+        records = [record for record in read_records(self.journal_path) if record[0] > sequence]
+        replay(state, records)
+
+        self.sequence = records[-1][0] if records else sequence
+        self._state = state
+        state.journal = self
+        if state.awaiting_input:
+            # Mid-prompt, so no snapshot yet: rewrite the intact records (dropping any torn tail)
+            # and keep appending; record() checkpoints once the prompt is answered.
+            self._file = open(self.journal_path, "wb")
+            self._buffer = [_encode(*record) for record in records]
+            self._since_checkpoint = len(records)
+            self.sync()
+        else:
+            self.checkpoint() # fold the replayed tail into a fresh checkpoint
+        return state
+
+
+def _encode(sequence, command, answers):
+    payload = json.dumps([sequence, command, list(answers)], separators=(",", ":")).encode()
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path):
+    """
+    Yields (sequence, command, answers) from a journal file, stopping at the first damaged record.
+    """
+    try:
+        with open(path, "rb") as journal_file:
+            data = journal_file.read()
+    except FileNotFoundError:
+        return
+
+    position = 0
+    while position + RECORD_HEADER.size <= len(data):
+        length, checksum = RECORD_HEADER.unpack_from(data, position)
+        start = position + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            return
+        sequence, command, answers = json.loads(payload)
+        yield sequence, command, answers
+        position = start + length
+
+
+def replay(state, records):
+    """
+    Re-runs journal records against a state with output and journaling switched off.
+    Prompts left unanswered inside a record pause, exactly as they did when recorded.
+    """
+    journal = getattr(state, "journal", None)
+    saved = (state._write, state._reader, state.capture_output, state.interactive)
+    state.journal = None
+    state._write, state._reader, state.capture_output, state.interactive = None, None, False, True
+    try:
+        for _, command, answers in records:
+            state.step(command, answers)
+    finally:
+        state._write, state._reader, state.capture_output, state.interactive = saved
+        state.journal = journal
+    return state
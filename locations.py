@@ -0,0 +1,161 @@
+from collections.abc import Mapping
+
+
+class LocationRegistry(Mapping):
+    """
+    Every named place on the map, indexed by key, by coordinate and by type.
+    It still reads like the old node_locations dict (registry['H']['unlocked']),
+    but node_at() is a dict lookup instead of a scan, the number of hacked nodes
+    is kept up to date as nodes fall, and nearby places can be found through a
+    coarse bucket grid instead of checking every location.
+    """
+
+    def __init__(self, node_locations=None, location_names=None, bucket_size=32):
+        self._records = {} # key -> {"x", "y", "type", ...}
+        self._by_position = {} # (x, y) -> key
+        self._by_type = {} # type -> [keys]
+        self._buckets = {} # (x // bucket_size, y // bucket_size) -> [keys]
+        self.bucket_size = bucket_size
+        self.names = dict(location_names or {}) # (x, y) -> display name, used as location_names
+        self.hacked_count = 0
+        self._hacked = frozenset() # keys of hacked nodes, rebuilt only when one changes
+
+        for key, record in (node_locations or {}).items():
+            self.add(key, record)
+
+    def __getitem__(self, key):
+        return self._records[key]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, key, record, name=None):
+        """
+        Registers a location. record is a dict with at least x, y and type.
+        """
+        if key in self._records:
+            raise ValueError(f"Location {key!r} is already registered")
+        position = (record['x'], record['y'])
+        self._records[key] = record
+        self._by_position[position] = key
+        self._by_type.setdefault(record['type'], []).append(key)
+        self._buckets.setdefault(self._bucket(position), []).append(key)
+        if name is not None:
+            self.names[position] = name
+        if record.get('hacked'):
+            self.hacked_count += 1
+            self._hacked = self._hacked | {key}
+
+    def at(self, position):
+        """
+        Key of the location at position, of any type, or None.
+        """
+        return self._by_position.get(position)
+
+    def node_at(self, position):
+        """
+        Key of the hackable node at position, or None.
+        """
+        key = self._by_position.get(position)
+        if key is not None and self._records[key]['type'] == 'node':
+            return key
+        return None
+
+    def position_of(self, key):
+        record = self._records[key]
+        return (record['x'], record['y'])
+
+    def of_type(self, location_type):
+        return list(self._by_type.get(location_type, ()))
+
+    def hub(self):
+        """
+        Key of the final hub, or None. Campaigns have exactly one, under any key.
+        """
+        hubs = self._by_type.get('hub')
+        return hubs[0] if hubs else None
+
+    def legend(self, game_map):
+        """
+        (symbol, name) for every place the map shows as a letter: named landmarks that
+        are not registered (the base) first, then each registered location by key.
+        """
+        landmarks = [(game_map[position], name) for position, name in self.names.items()
+                     if position not in self._by_position and game_map[position] not in ".X"]
+        return landmarks + [(key, self.name_at(self.position_of(key), key)) for key in self._records]
+
+    def name_at(self, position, default="Unknown Sector"):
+        return self.names.get(position, default)
+
+    @property
+    def node_count(self):
+        return len(self._by_type.get('node', ()))
+
+    def all_nodes_hacked(self):
+        return self.hacked_count == self.node_count
+
+    def hacked_keys(self):
+        return self._hacked
+
+    def mark_hacked(self, key):
+        """
+        Marks a node as hacked. Once every node is hacked each hub is unlocked.
+        Returns True if this hack unlocked the hubs.
+        """
+        record = self._records[key]
+        if record.get('hacked'):
+            return False
+        record['hacked'] = True
+        self.hacked_count += 1
+        self._hacked = self._hacked | {key}
+        return self._unlock_hubs_if_ready()
+
+    def set_hacked(self, key, hacked):
+        """
+        Sets a node's hacked flag directly (used when restoring state); hubs are re-evaluated.
+        """
+        record = self._records[key]
+        if bool(record.get('hacked')) != bool(hacked):
+            self.hacked_count += 1 if hacked else -1
+            self._hacked = self._hacked | {key} if hacked else self._hacked - {key}
+        record['hacked'] = bool(hacked)
+        self._unlock_hubs_if_ready()
+        if not self.all_nodes_hacked():
+            for hub in self._by_type.get('hub', ()):
+                self._records[hub]['unlocked'] = False
+
+    def within(self, position, radius, location_type=None):
+        """
+        Keys of locations within Manhattan distance `radius` of position, nearest first.
+        Only the buckets overlapping the search square are visited.
+        """
+        x, y = position
+        size = self.bucket_size
+        found = []
+        for bx in range((x - radius) // size, (x + radius) // size + 1):
+            for by in range((y - radius) // size, (y + radius) // size + 1):
+                for key in self._buckets.get((bx, by), ()):
+                    record = self._records[key]
+                    if location_type is not None and record['type'] != location_type:
+                        continue
+                    distance = abs(record['x'] - x) + abs(record['y'] - y)
+                    if distance <= radius:
+                        found.append((distance, key))
+        found.sort()
+        return [key for _, key in found]
+
+    def _bucket(self, position):
+        return (position[0] // self.bucket_size, position[1] // self.bucket_size)
+
+    def _unlock_hubs_if_ready(self):
+        if not self.all_nodes_hacked():
+            return False
+        unlocked = False
+        for hub in self._by_type.get('hub', ()):
+            if not self._records[hub].get('unlocked'):
+                self._records[hub]['unlocked'] = True
+                unlocked = True
+        return unlocked
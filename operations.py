@@ -1,70 +1,44 @@
-import random, re
+import heapq, random, re
+import profiler
 from data_structures import LinkedList, Stack, Queue, PriorityQueue
+from renderer import MapRenderer
 
-def get_player_name(story_text):
+HISTORY_RETENTION = 5000  # oldest log entries are dropped past this many
+ENDING_HISTORY_LINES = 50  # the ending only replays the tail of long sessions
+HACK_PATHS = ('firewall', 'router', 'server')  # possible answers in the hacking mini-game
+
+
+def get_player_name(story_text, read=input, out=print):
     """
     Prompt the player for a valid name (only letters and spaces).
     Keeps asking until valid input is given.
     """
     while True:
-        player_name_input = input(story_text["intro"] + " ")
-        if re.fullmatch(r'[A-Za-z\s]+', player_name_input.strip()):
+        player_name_input = read(story_text["intro"] + " ")
+        if is_valid_player_name(player_name_input):
             return player_name_input.strip()
         else:
-            print("Invalid name. Name must contain only alphabetic characters and spaces. Please try again.")
+            out("Invalid name. Name must contain only alphabetic characters and spaces. Please try again.")
+
+
+def is_valid_player_name(name):
+    return re.fullmatch(r'[A-Za-z\s]+', name.strip()) is not None
 
 
-def display_map(game_map, player_position, original_map_elements, location_names):
+def display_map(game_map, player_position, original_map_elements, location_names, renderer=None, out=print, markers=None):
     """
     Display the game map
-    A 2-D list is used to model a grid based layout for making positional logic.
-    """
-
-    # Top Header Box
-    print("\n" + "-"*40)
-    print("|{:^38}|".format("▲ North"))
-    print("-"*40)
-    print("|{:^38}|".format("Kathmandu - The Last Protocol"))
-
-    # Location display
-    location_display = location_names.get(player_position, "Unknown Sector")
-    print("|    Location: {:<24}|".format(location_display))
-    print("-"*40)
-
-    # Map Grid Box
-    for i in range(len(game_map)):
-        row_display = "| "
-        for j in range(len(game_map[i])):
-            if (i,j) == player_position:
-                row_display += "*  "
-            else:
-                row_display += f"{original_map_elements[i][j]}  "
-        row_display = row_display.rstrip() + " |"
-        print(row_display)
-    print("-"*40)
-
-    # Map Legend Box
-    print("\n" + "-"*40)
-    print("|{:^38}|".format("--- Map Legend ---"))
-    legend_items = [
-        "[*]: Your Position",
-        "[L]: Lazimpat (Your Base)",
-        "[T]: Thamel Network Node",
-        "[B]: Baneshwor Node",
-        "[D]: Durbar Square Node",
-        "[H]: Patan Data Hub (Final Mission)",
-        "[X]: Obstacle",
-        "[.]: Empty"
-    ]
-
-    for item in legend_items:
-        print("| {:<37}|".format(item))
-    print("-"*40)
-
-
-def move_player(player_position, direction, map, history, npc_queue, drone_queue, location_names, undo_stack):
-    """
-    Moves the player, updates the undo stack, and handles boundary/obstacle checks.
+    The map is a Grid (one byte per cell, row-major) used for all positional logic.
+    Only a viewport around the player is drawn, so large generated cities stay readable.
+    `markers` maps positions to symbols drawn over the map, e.g. pursuing drones.
+    """
+    renderer = renderer or MapRenderer()
+    out(renderer.render(original_map_elements, player_position, location_names, markers=markers).rstrip("\n"))
+
+
+def move_player(player_position, direction, map, history, npc_queue, drone_queue, location_names, out=print):
+    """
+    Moves the player and handles boundary/obstacle checks.
     """
     x, y = player_position
     new_x, new_y = x, y 
@@ -78,133 +52,175 @@ def move_player(player_position, direction, map, history, npc_queue, drone_queue
     elif direction == "west":
         new_y -= 1
     else:
-        print("\nInvalid Direction.\nUse north, south, east, or west.")
+        out("\nInvalid Direction.\nUse north, south, east, or west.")
         return player_position
     
-    if new_x < 0 or new_x >= len(map) or new_y < 0 or new_y >= len(map[0]):
-        print("\nYou cannot move outside the city limits")
+    if not map.in_bounds(new_x, new_y):
+        out("\nYou cannot move outside the city limits")
         return player_position
     
-    if map[new_x][new_y] == "X":
-        print("\n!!! An obstacle blocks you path.!!!\nFind another way")
+    if map.is_blocked(new_x, new_y):
+        out("\n!!! An obstacle blocks you path.!!!\nFind another way")
         return player_position
 
     if not npc_queue.is_empty():
-        print(f"\nA wave of {npc_queue.dequeue()} slows your movement momentarily")
-
-    handle_drone_patrol(drone_queue)
+        out(f"\nA wave of {npc_queue.dequeue()} slows your movement momentarily")
 
-    undo_stack.push(player_position)
+    handle_drone_patrol(drone_queue, out)
 
     history.append(f"Moved {direction} to {location_names.get((new_x, new_y), 'Unkown Sector')}")
     return (new_x, new_y)
 
 
-def recursive_network_penetration(attempts_left):
+def run_prompts(steps, read=input, out=print):
     """
-    Simulates a recursive hacking mini-game by guessing the answer.
-    Recursion is used to model the repeated probing of network connections in a branching, tree-like fashion.
+    Drives a prompt generator (see hack_minigame) from a terminal or any read/out pair.
+    ("say", text) is shown with out, ("ask", prompt) is answered with read and sent back.
+    Returns the generator's final value.
     """
-    if attempts_left == 0:
-        print("!!! Network Penetration Failed !!!\n Max Attempt reached")
-        return False 
-    
-    print(f"\n--- Hacking Protocol ---\n Attempts Left: {attempts_left}")
-    print("Trace the network connection.\nEnter 'firewall', 'router' or 'server' to hack the system.")
-    correct_path = random.choice(['firewall', 'server', 'router'])
-    user_input = input("> ").lower().strip()  # Added strip for better input handling
-
-    if user_input == correct_path:
-        print("Correct Path Found! Access Granted")
-        return True 
-    else:
-        print("!!!Incorrect Path!!! \nRetrying.....")
-        return recursive_network_penetration(attempts_left - 1)
+    reply = None
+    try:
+        while True:
+            kind, text = steps.send(reply)
+            if kind == "ask":
+                reply = read(text)
+            else:
+                out(text)
+                reply = None
+    except StopIteration as finished:
+        return finished.value
 
 
-def hack_node(player_position, node_locations, history, drone_queue, location_names, undo_stack):
+def hack_minigame(attempts, answers=HACK_PATHS, rng=None):
     """
-    Handles the hacking process of the network node.
+    The hacking mini-game: guess which part of the network the connection runs through.
+    Written as a generator-driven state machine rather than recursion, so any number of
+    attempts runs at constant stack depth and the game can be played by a script.
+    Yields ("say", text) and ("ask", prompt); send() the guess after each "ask".
+    Returns True once the right path is found.
+    rng is the game's own random.Random, which makes a seeded session replayable.
+    Raises ValueError straight away if there are no answers to choose from.
+    """
+    options = answer_options(answers)
+    return _hack_rounds(attempts, tuple(answers), options, rng or random.Random()) # never the shared module-level generator
+
+
+def answer_options(answers):
     """
-    node_id = None 
+    The answers as the prompt lists them: 'a', 'b' or 'c'; just 'a' if there is only one.
+    """
+    if not answers:
+        raise ValueError("The hacking minigame needs at least one possible answer")
+    quoted = [f"'{answer}'" for answer in answers]
+    return quoted[0] if len(quoted) == 1 else ", ".join(quoted[:-1]) + " or " + quoted[-1]
+
+
+def _hack_rounds(attempts, answers, options, rng):
+    for attempts_left in range(attempts, 0, -1):
+        yield "say", f"\n--- Hacking Protocol ---\n Attempts Left: {attempts_left}"
+        yield "say", f"Trace the network connection.\nEnter {options} to hack the system."
+        correct_path = rng.choice(answers)
+        user_input = yield "ask", "> "
+
+        if (user_input or "").lower().strip() == correct_path:
+            yield "say", "Correct Path Found! Access Granted"
+            return True
+        yield "say", "!!!Incorrect Path!!! \nRetrying....."
+
+    yield "say", "!!! Network Penetration Failed !!!\n Max Attempt reached"
+    return False
 
-    for key, loc in node_locations.items():
-        if (loc['x'], loc['y']) == player_position and loc['type'] == 'node':
-            node_id = key
-            break 
 
+def network_penetration(attempts_left, read=input, out=print, rng=None, answers=HACK_PATHS):
+    """
+    Plays the hacking mini-game through read/out and returns whether it succeeded.
+    """
+    return run_prompts(hack_minigame(attempts_left, answers, rng), read, out)
+
+
+def hack_node_steps(player_position, node_locations, history, drone_queue, location_names, rng=None, attempts=3, alert_drones=1, answers=HACK_PATHS):
+    """
+    The hacking process of a network node as a prompt generator (see run_prompts).
+    node_locations is a LocationRegistry, so finding the node here is a single lookup.
+    Returns True if a node was hacked, False if the hack failed, None if there was nothing to hack.
+    """
+    node_id = node_locations.node_at(player_position)
     
     if not node_id:
-        print("You are not at a hackable network node.")
-        return 
+        yield "say", "You are not at a hackable network node."
+        return None
     
     if node_locations[node_id]['hacked']:
-        print("This node is already hacked")
-        return 
-    
-    undo_stack.push(player_position)
+        yield "say", "This node is already hacked"
+        return None
 
-    print(f"Initiating hack on {location_names.get(player_position)} ...")
-    hack_success = recursive_network_penetration(3)
+    yield "say", f"Initiating hack on {location_names.get(player_position)} ..."
+    hack_success = yield from hack_minigame(attempts, answers, rng)
+
+    if hack_success and node_locations[node_id]['hacked']:
+        # In a shared world another operative can finish the same node while this hack is running
+        yield "say", f"{location_names.get(player_position)} was breached by another operative first."
+        return None
 
     if hack_success:
-        node_locations[node_id]['hacked'] = True
-        print(f"Node {location_names.get(player_position)} successfully hacked! \nOblivion's control weakens.")
+        hub_unlocked = node_locations.mark_hacked(node_id)
+        yield "say", f"Node {location_names.get(player_position)} successfully hacked! \nOblivion's control weakens."
         history.append(f"Hacked {location_names.get(player_position)}")
 
-        if all(node_locations[n]['hacked'] for n in ['T', 'B', 'D']):
-            node_locations['H']['unlocked'] = True
-            print("All network nodes breached. The Patan Data Hub is now accessible!")
-    else:
-        print("Hack failed. Oblivion's defenses are strong. A security alert is triggered!")
-        history.append(f"Failed hack attempt at {location_names.get(player_position)}")
-        drone_queue.enqueue("Kumari Protocol Drone", 1)  # Enqueue only if space available (handled in class)
-        handle_drone_patrol(drone_queue)
+        if hub_unlocked:
+            yield "say", "All network nodes breached. The Patan Data Hub is now accessible!"
+        return True
 
+    yield "say", "Hack failed. Oblivion's defenses are strong. A security alert is triggered!"
+    history.append(f"Failed hack attempt at {location_names.get(player_position)}")
+    for _ in range(alert_drones):
+        if drone_queue.enqueue("Kumari Protocol Drone", 1) is None:  # Rejected by the queue's overflow policy
+            yield "say", "Drone queue is full; cannot add more threats."
+            break
+    messages = []
+    handle_drone_patrol(drone_queue, messages.append)
+    for message in messages:
+        yield "say", message
+    return False
 
-def undo_move(undo_stack, player_position, history, location_names):
+
+def hack_node(player_position, node_locations, history, drone_queue, location_names, read=input, out=print, rng=None, attempts=3, alert_drones=1, answers=HACK_PATHS):
     """
-    Reverts the player to previous postion using the undo stack.
+    Handles the hacking process of the network node.
+    attempts is the number of guesses allowed; alert_drones is how many drones a failed hack calls in.
     """
+    steps = hack_node_steps(player_position, node_locations, history, drone_queue, location_names,
+                            rng, attempts, alert_drones, answers)
+    return run_prompts(steps, read, out)
 
-    if undo_stack.is_empty():
-        print("You cannot do undo. There are no previous moves to revert to.")
-        return player_position
-    
-    previous_position = undo_stack.pop()
-
-    print(f"Reverting to previous location: {location_names.get(previous_position, 'Unknown Sector')}")
-
-    history.append(f"Undid a move, reverting to {location_names.get(previous_position, 'Unknown Sector')}")
-  
-    return previous_position
 
-
-def handle_npc_crowd(npc_queue):
+def handle_npc_crowd(npc_queue, rng=None, spawn_chance=1/3):
     """
     Add NPCs to the queue to slow down the player.
     """
-
-    if random.randint(1, 3) == 1:
-        crowd_type = random.choice(["commuters rushing to work", 
+    rng = rng or random.Random()
+    if rng.random() < spawn_chance:
+        crowd_type = rng.choice(["commuters rushing to work", 
                                     "delivery drones crisscrossing the sky", 
                                     "tourists taking selfies"])
         npc_queue.enqueue(crowd_type)
 
 
-def handle_drone_patrol(drone_queue):
+def handle_drone_patrol(drone_queue, out=print, distance=None):
     """
     Manages high-priority drone threats.
+    `distance` is how many moves away the pursuing drone is, if known.
     """
     if not drone_queue.is_empty():
         threat = drone_queue.peek()
         if threat == "Kumari Protocol Drone":
-            print("\n!!! A high-priority Kumari Protocol Drone is actively pursuing you! Type 'bypass drone' if you have the right tool!")
+            where = "" if distance is None else f" ({distance} blocks away)"
+            out(f"\n!!! A high-priority Kumari Protocol Drone is actively pursuing you{where}! Type 'bypass drone' if you have the right tool!")
         else:
-            print(f"You encounter a {drone_queue.dequeue()}. You manage to slip past.")
+            out(f"You encounter a {drone_queue.dequeue()}. You manage to slip past.")
 
 
-def bypass_drone(inventory, drone_queue):
+def bypass_drone(inventory, drone_queue, out=print):
     """
     Allows player to bypass a high-priority done using a specific item
     """
@@ -213,54 +229,56 @@ def bypass_drone(inventory, drone_queue):
         if "VPN_app" in inventory:
             inventory.remove("VPN_app")
             drone_queue.dequeue()
-            print("You successfully deployed your VPN app and bypassed the Kumari Protocol Drone!")
+            out("You successfully deployed your VPN app and bypassed the Kumari Protocol Drone!")
             return True
         else:
-            print("You need a 'VPN_app' in your inventory to bypass the drone.")
+            out("You need a 'VPN_app' in your inventory to bypass the drone.")
             return False
         
     else:
-        print("No high priority drone to bypass at the moment")
+        out("No high priority drone to bypass at the moment")
 
 
-def trigger_ending(end_type, history, story_text):
+def trigger_ending(end_type, history, story_text, out=print):
     """
     Triggers and displays the final ending.
+    Returns the ending type so callers can record the outcome.
     """
     if end_type == "good":
-        print("\n--- GOOD ENDING: The Digital Guardian ---")
-        print(story_text['good_ending'])
-        print("\nFinal history log:")
-        history.display()
-        print("Game Over.")
+        out("\n--- GOOD ENDING: The Digital Guardian ---")
+        out(story_text['good_ending'])
+        out("\nFinal history log:")
+        history.display(last=ENDING_HISTORY_LINES, out=out)
+        out("Game Over.")
     elif end_type == "bad":
-        print("\n--- BAD ENDING: The Digital Collapse ---")
-        print(story_text['bad_ending'])
-        print("\nFinal history log:")
-        history.display()
-        print("Game Over.")
+        out("\n--- BAD ENDING: The Digital Collapse ---")
+        out(story_text['bad_ending'])
+        out("\nFinal history log:")
+        history.display(last=ENDING_HISTORY_LINES, out=out)
+        out("Game Over.")
+    return end_type
 
 
-def final_protocol(player_position, node_locations, history, story_text):
+def final_protocol_steps(player_position, node_locations, history, story_text):
     """
-    Manages the final choice of the game and lead to an end.
+    Manages the final choice of the game and lead to an end, as a prompt generator (see run_prompts).
+    Returns "good" or "bad" for the ending reached, or None if the player backed out.
     """
-    print(story_text["final_protocol_start"])
+    yield "say", story_text["final_protocol_start"]
 
     invalid_count = 0  # Added to prevent infinite invalid inputs
     max_invalid = 5
 
     while True:
         if invalid_count >= max_invalid:
-            print("Too many invalid commands. Protocol failed due to errors.")
-            trigger_ending("bad", history, story_text)
-            return
+            yield "say", "Too many invalid commands. Protocol failed due to errors."
+            return (yield from _ending_steps("bad", history, story_text))
 
-        final_cmd = input("> ").lower().strip().split()
+        final_cmd = (yield "ask", "> ").lower().strip().split()
         
         if not final_cmd:
             invalid_count += 1
-            print("Invalid input. Please enter a command.")
+            yield "say", "Invalid input. Please enter a command."
             continue
 
         cmd = final_cmd[0]
@@ -269,156 +287,141 @@ def final_protocol(player_position, node_locations, history, story_text):
         if cmd == "protocol":
             if not args:
                 invalid_count += 1
-                print("Usage: protocol <type> (containment or obliteration)")
+                yield "say", "Usage: protocol <type> (containment or obliteration)"
                 continue
         
             protocol_type = args[0]
             if protocol_type == "containment":
-                print("\nInitiating Containment Protocol...")
+                yield "say", "\nInitiating Containment Protocol..."
 
                 protocol_steps = Stack()
                 protocol_steps.push("Step 3: Upload containment protocol")
                 protocol_steps.push("Step 2: Deploy isolation code")
                 protocol_steps.push("Step 1: Secure access points")
 
-                print("Protocol steps loaded. Enter 'next' to proceed, or 'undo' to revert.")
+                yield "say", "Protocol steps loaded. Enter 'next' to proceed, or 'undo' to revert."
 
                 step_invalid_count = 0  # Added for inner loop safety
                 max_step_invalid = 5
 
                 while not protocol_steps.is_empty():
                     if step_invalid_count >= max_step_invalid:
-                        print("Too many errors in protocol steps. Protocol failed.")
-                        trigger_ending("bad", history, story_text)
-                        return
+                        yield "say", "Too many errors in protocol steps. Protocol failed."
+                        return (yield from _ending_steps("bad", history, story_text))
 
-                    print(f"Current step: {protocol_steps.peek()}")
+                    yield "say", f"Current step: {protocol_steps.peek()}"
 
-                    action = input("> ").lower().strip()
+                    action = (yield "ask", "> ").lower().strip()
 
                     if action == "next":
                         history.append(f"Completed step: {protocol_steps.pop()}")
-                        print("Step complete.")
+                        yield "say", "Step complete."
                     elif action == "undo":
                         if protocol_steps.peek() == "Step 3: Upload containment protocol":
-                            print("This is the final step. You can't undo it. It's now or never.")
-                            print("You must enter 'next' to proceed, otherwise the protocol fails.")
+                            yield "say", "This is the final step. You can't undo it. It's now or never."
+                            yield "say", "You must enter 'next' to proceed, otherwise the protocol fails."
                         else:
                             if protocol_steps.is_empty():  # Extra check
-                                print("No steps to undo.")
+                                yield "say", "No steps to undo."
                                 continue
                             reverted_step = protocol_steps.pop()
-                            print(f"Undoing step: {reverted_step}")
+                            yield "say", f"Undoing step: {reverted_step}"
                             history.append(f"Undid step: {reverted_step}")
-                            print("Reverted to previous step.")
+                            yield "say", "Reverted to previous step."
                     else:
                         step_invalid_count += 1
-                        print("Invalid command. Use 'next' or 'undo'.")
+                        yield "say", "Invalid command. Use 'next' or 'undo'."
                 
-                trigger_ending("good", history, story_text)
-                return
+                return (yield from _ending_steps("good", history, story_text))
 
             elif protocol_type == "obliteration":
-                print("\nInitiating Obliteration Protocol...")
-                print("WARNING: This action is irreversible. There is no undo for Obliteration.")
-                confirm = input("Confirm (yes/no): ").lower().strip()
+                yield "say", "\nInitiating Obliteration Protocol..."
+                yield "say", "WARNING: This action is irreversible. There is no undo for Obliteration."
+                confirm = (yield "ask", "Confirm (yes/no): ").lower().strip()
 
                 if confirm == "yes":
-                    trigger_ending("bad", history, story_text)
-                else:
-                    print("Obliteration Protocol cancelled.")
-                return
+                    return (yield from _ending_steps("bad", history, story_text))
+                yield "say", "Obliteration Protocol cancelled."
+                return None
             else:
                 invalid_count += 1
-                print("Invalid protocol type. Use 'containment' or 'obliteration'.")
+                yield "say", "Invalid protocol type. Use 'containment' or 'obliteration'."
         else:
             invalid_count += 1
-            print("Invalid command. You must choose a protocol or ask for help.")
+            yield "say", "Invalid command. You must choose a protocol or ask for help."
 
 
-def find_path_a_star(start_position, end_position, map):
+def _ending_steps(end_type, history, story_text):
+    messages = []
+    trigger_ending(end_type, history, story_text, messages.append)
+    for message in messages:
+        yield "say", message
+    return end_type
+
+
+def final_protocol(player_position, node_locations, history, story_text, read=input, out=print):
     """
-    Finds the shortest path from start_pos to end_pos using the A* search algorithm.
+    Manages the final choice of the game and lead to an end.
+    Returns "good" or "bad" for the ending reached, or None if the player backed out.
     """
+    return run_prompts(final_protocol_steps(player_position, node_locations, history, story_text), read, out)
 
-    class Node:
-        def __init__(self, parent=None, position=None):
-            self.parent = parent
-            self.position = position
-            self.g = 0  # Cost from start to current node
-            self.h = 0  # Heuristic (estimated cost from current to end)
-            self.f = 0  # Total cost (g + h)
 
-        def __eq__(self, other):
-            return self.position == other.position
+def find_path_a_star(start_position, end_position, map):
+    """
+    Finds the shortest path from start_pos to end_pos using the A* search algorithm.
+    The open list is a binary heap and the closed list a set, so each expansion is O(log n).
+    Ties on f are broken by insertion order, matching the original list-based search.
+    """
 
-        def __repr__(self):
-            return f"Node(pos={self.position}, f={self.f})"
-        
-    
     def heuristic(a, b):
         """
         Manhattan distance heuristic.
         """
         return abs(a[0] - b[0]) + abs(a[1] - b[1])
-    
-    start_node = Node(None, start_position)
-    start_node.g = start_node.h = start_node.f = 0
-    end_node = Node(None, end_position)
-    end_node.g = end_node.h = end_node.f = 0
-
-    open_list = []
-    closed_list = []
 
-    open_list.append(start_node)
+    rows, cols = map.rows, map.cols
+    counter = 0 # insertion order for stable tie-breaking
 
-    max_iterations = 100  # Added to prevent infinite loop in large maps
-    iteration = 0
+    open_heap = [(heuristic(start_position, end_position), counter, start_position)]
+    best_g = {start_position: 0}  # Cost from start to each discovered position
+    parents = {start_position: None}
+    closed = set()
 
-    while len(open_list) > 0 and iteration < max_iterations:
-        iteration += 1
-        current_node = open_list[0]
-        current_index = 0
-        for index, item in enumerate(open_list):
-            if item.f < current_node.f:
-                current_node = item
-                current_index = index
+    while open_heap:
+        _, _, position = heapq.heappop(open_heap)
+        if position in closed:
+            continue # stale heap entry, a cheaper one was already expanded
+        closed.add(position)
 
-        open_list.pop(current_index)
-        closed_list.append(current_node)
-
-        if current_node == end_node:
+        if position == end_position:
+            if profiler.active is not None:
+                profiler.active.record_search("a_star", len(closed))
             path = []
-            current = current_node
-            while current is not None:
-                path.append(current.position)
-                current = current.parent
+            while position is not None:
+                path.append(position)
+                position = parents[position]
             return path[::-1] # Return reversed path
 
-        children = []
-        for new_position in [(0, -1), (0, 1), (-1, 0), (1, 0)]: # Adjacent squares
-            node_position = (current_node.position[0] + new_position[0], current_node.position[1] + new_position[1])
+        g = best_g[position] + 1
+        for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)): # Adjacent squares
+            x, y = position[0] + dx, position[1] + dy
 
-            if node_position[0] > (len(map) - 1) or node_position[0] < 0 or node_position[1] > (len(map[0]) - 1) or node_position[1] < 0:
+            if x < 0 or x >= rows or y < 0 or y >= cols:
                 continue
 
-            if map[node_position[0]][node_position[1]] == 'X':
+            if map.is_blocked(x, y):
                 continue
 
-            new_node = Node(current_node, node_position)
-            children.append(new_node)
-
-        for child in children:
-            if child in closed_list:
+            child = (x, y)
+            if child in closed or g >= best_g.get(child, g + 1):
                 continue
 
-            child.g = current_node.g + 1
-            child.h = heuristic(child.position, end_node.position)
-            child.f = child.g + child.h
+            best_g[child] = g
+            parents[child] = position
+            counter += 1
+            heapq.heappush(open_heap, (g + heuristic(child, end_position), counter, child))
 
-            if any(open_node for open_node in open_list if child == open_node and child.g >= open_node.g):
-                continue
-
-            open_list.append(child)
-    
-    return None
\ No newline at end of file
+    if profiler.active is not None:
+        profiler.active.record_search("a_star", len(closed))
+    return None
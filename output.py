@@ -0,0 +1,64 @@
+import sys
+
+
+class StreamSink:
+    """
+    Writes to a text stream (stdout by default) and flushes it, so each flush of
+    the buffer is a single write to the terminal or pipe.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, text):
+        stream = self.stream or sys.stdout
+        stream.write(text)
+        stream.flush()
+
+
+class OutputBuffer:
+    """
+    A drop-in replacement for print as the game's `out`: calls are collected in memory
+    and flush() hands the whole turn to the sink in one write. The map, history pages
+    and endings each print dozens of lines, which would otherwise be a write apiece.
+
+        out = OutputBuffer(StreamSink())
+        state = GameState(out=out, read=out.flushing(input))
+        state.step("map")
+        out.flush()
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink or StreamSink()
+        self._parts = []
+
+    def __call__(self, *values, sep=" ", end="\n"):
+        self._parts.append(sep.join(str(value) for value in values) + end)
+
+    def write(self, text):
+        self._parts.append(text)
+
+    @property
+    def pending(self):
+        return bool(self._parts)
+
+    def flush(self):
+        if self._parts:
+            text = "".join(self._parts)
+            self._parts.clear()
+            self.sink.write(text)
+
+    def discard(self):
+        self._parts.clear()
+
+    def flushing(self, read=input):
+        """
+        Wraps a read function (input by default) so anything buffered is shown before
+        the player is asked a question in the middle of a command, such as a hacking guess.
+        The prompt goes out in the same write as the output before it.
+        """
+        def read_after_flush(prompt=""):
+            self._parts.append(prompt)
+            self.flush()
+            return read()
+        return read_after_flush
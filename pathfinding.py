@@ -0,0 +1,466 @@
+import heapq
+from array import array
+from collections import deque
+from grid import OBSTACLE, step_into, wavefronts
+import profiler
+
+
+class PathCache:
+    """
+    Caches shortest paths to fixed targets (the network nodes and the hub).
+    One BFS per target builds a distance table and a next-hop table for the whole map,
+    after which any path to that target is read off in O(path length) with no search.
+    The tables are rebuilt automatically when the grid's obstacle version changes.
+    """
+
+    def __init__(self, game_map, targets=()):
+        self.map = game_map
+        self._tables = {} # target position -> (distance table, next-hop table)
+        self._layout = self._layout_key()
+        for target in targets:
+            self._tables[target] = self._build_table(target)
+
+    @classmethod
+    def for_nodes(cls, game_map, node_locations):
+        """
+        Builds a cache with tables for every entry of node_locations.
+        """
+        targets = [(loc['x'], loc['y']) for loc in node_locations.values()]
+        return cls(game_map, targets)
+
+    def find_path(self, start_position, end_position):
+        """
+        Returns the list of positions from start to end (both included), or None if unreachable.
+        Targets that were not precomputed get a table built on first use.
+        """
+        self._check_layout()
+
+        table = self._tables.get(end_position)
+        if table is None:
+            table = self._tables[end_position] = self._build_table(end_position)
+        distance, next_hop = table
+
+        cols = self.map.cols
+        if not self.map.in_bounds(*start_position):
+            return None
+        index = start_position[0] * cols + start_position[1]
+        if distance[index] < 0:
+            return None
+
+        path = [start_position]
+        while index != next_hop[index]:
+            index = next_hop[index]
+            path.append(divmod(index, cols))
+        return path
+
+    def distance(self, start_position, end_position):
+        """
+        Number of moves between two positions, or None if unreachable.
+        """
+        path = self.find_path(start_position, end_position)
+        return None if path is None else len(path) - 1
+
+    def invalidate(self):
+        """
+        Drops every table; targets are rebuilt lazily on their next query.
+        """
+        self._tables.clear()
+        self._layout = self._layout_key()
+
+    def _check_layout(self):
+        layout = self._layout_key()
+        if layout != self._layout:
+            targets = list(self._tables)
+            self._tables.clear()
+            self._layout = layout
+            for target in targets:
+                self._tables[target] = self._build_table(target)
+
+    def _layout_key(self):
+        return self.map.version
+
+    def _build_table(self, target):
+        """
+        Breadth-first search outward from the target. For each reached cell the
+        next hop is the neighbour it was discovered from, i.e. one step closer to the target.
+        """
+        game_map = self.map
+        rows, cols, cells = game_map.rows, game_map.cols, game_map.cells
+        distance = array('i', [-1]) * (rows * cols)
+        next_hop = array('i', [-1]) * (rows * cols)
+
+        if not game_map.in_bounds(*target) or game_map.is_blocked(*target):
+            return distance, next_hop
+
+        target_index = target[0] * cols + target[1]
+        distance[target_index] = 0
+        next_hop[target_index] = target_index
+        frontier = deque([target_index])
+
+        while frontier:
+            index = frontier.popleft()
+            x, y = divmod(index, cols)
+            step = distance[index] + 1
+            for neighbour, ok in ((index - 1, y > 0), (index + 1, y < cols - 1),
+                                  (index - cols, x > 0), (index + cols, x < rows - 1)):
+                if not ok or distance[neighbour] >= 0 or cells[neighbour] == OBSTACLE:
+                    continue
+                distance[neighbour] = step
+                next_hop[neighbour] = index
+                frontier.append(neighbour)
+
+        if profiler.active is not None:
+            profiler.active.record_search("path_table_bfs", len(distance) - distance.count(-1))
+        return distance, next_hop
+
+
+CLUSTER_SIZE = 32 # side of an HPA* cluster in cells
+ENTRANCE_SPLIT = 6 # open border stretches this long get an entrance at each end instead of one in the middle
+ENTRANCE_GAP = 6 # fewest cells between stretches that join the same two regions; fewer entrances, faster but longer paths
+HPA_MIN_CELLS = 1000 * 1000 # maps this big use HierarchicalPathfinder; whole-map tables get too costly
+
+
+class HierarchicalPathfinder:
+    """
+    HPA* (hierarchical path-finding A*) for very large maps, where PathCache's
+    whole-map tables cost too much memory and build time and plain A* expands too many cells.
+
+    The grid is cut into square clusters, and each cluster into regions (cells connected
+    without leaving it). Wherever two regions of neighbouring clusters meet across the border,
+    an entrance links a cell on each side. find_path() searches the graph of entrances, then
+    fills in each leg with a search confined to one cluster. Clusters are analysed the first
+    time a search reaches them, so a query only pays for the clusters along its route.
+
+    Paths are not always the shortest: every border is crossed at one of its few entrances,
+    however far that is from where the shortest path crosses. There is no hard bound on
+    the detour. On 400x400 maps with 20% obstacles, measured against exact BFS, paths
+    averaged 2% longer with 32-cell clusters (4% with 16), and the worst were about 30%
+    (40-50 steps) longer. tests/test_pathfinding.py checks them against PathCache.
+
+    When the grid's obstacle version changes, only the clusters holding changed cells
+    and their neighbours are forgotten, to be analysed again on demand.
+    """
+
+    def __init__(self, game_map, cluster_size=CLUSTER_SIZE):
+        self.map = game_map
+        self.cluster_size = cluster_size
+        self.invalidate()
+
+    def find_path(self, start_position, end_position):
+        """
+        Returns the list of positions from start to end (both included), or None if unreachable.
+        """
+        self._check_layout()
+        game_map = self.map
+        for position in (start_position, end_position):
+            if not game_map.in_bounds(*position) or game_map.is_blocked(*position):
+                return None
+        if start_position == end_position:
+            return [start_position]
+
+        route = self._abstract_path(start_position, end_position)
+        if route is None:
+            return None
+
+        # Entrance hops are single steps; every other leg stays inside one cluster
+        path = [start_position]
+        for here, there in zip(route, route[1:]):
+            if self._cluster_of(here) != self._cluster_of(there):
+                path.append(there)
+            else:
+                path.extend(self._local_path(here, there)[1:])
+        return path
+
+    def distance(self, start_position, end_position):
+        """
+        Number of moves along the path found, or None if unreachable.
+        """
+        path = self.find_path(start_position, end_position)
+        return None if path is None else len(path) - 1
+
+    def invalidate(self):
+        """
+        Drops everything worked out so far; clusters are analysed again as queries reach them.
+        """
+        self._regions = {} # cluster -> region label per cell, 0 for obstacles
+        self._borders = {} # (cluster, right or lower neighbour) -> [(cell, cell across)]
+        self._graphs = {} # cluster -> {entrance: [(entrance, distance)]}
+        self._shape = None
+        self._layout = None
+        self._snapshot = None
+
+    def _check_layout(self):
+        game_map = self.map
+        if (game_map.rows, game_map.cols) != self._shape:
+            self.invalidate()
+            self._shape = (game_map.rows, game_map.cols)
+            self._cluster_rows = -(-game_map.rows // self.cluster_size)
+            self._cluster_cols = -(-game_map.cols // self.cluster_size)
+        elif game_map.version != self._layout:
+            self._repair(self._changed_cells())
+        else:
+            return
+        self._layout = game_map.version
+        self._snapshot = bytes(game_map.cells)
+
+    def _changed_cells(self):
+        # Cells whose obstacle state differs from the last snapshot; whole rows are compared first
+        old, cells, cols = self._snapshot, self.map.cells, self.map.cols
+        changed = []
+        for x in range(self.map.rows):
+            offset = x * cols
+            if old[offset:offset + cols] == cells[offset:offset + cols]:
+                continue
+            for y in range(cols):
+                if (old[offset + y] == OBSTACLE) != (cells[offset + y] == OBSTACLE):
+                    changed.append((x, y))
+        return changed
+
+    def _repair(self, changed):
+        """
+        Forgets the regions and borders of every cluster holding a changed cell, and the
+        entrance graphs of those clusters and their neighbours. The rest stays as it was.
+        """
+        for cluster in {self._cluster_of(position) for position in changed}:
+            self._regions.pop(cluster, None)
+            for border, _ in self._sides(cluster):
+                self._borders.pop(border, None)
+                for neighbour in border:
+                    self._graphs.pop(neighbour, None)
+
+    def _cluster_of(self, position):
+        return position[0] // self.cluster_size, position[1] // self.cluster_size
+
+    def _bounds(self, cluster):
+        size = self.cluster_size
+        return (cluster[0] * size, min((cluster[0] + 1) * size, self.map.rows),
+                cluster[1] * size, min((cluster[1] + 1) * size, self.map.cols))
+
+    def _sides(self, cluster):
+        # (border, which side of it the cluster is on) for every neighbouring cluster
+        cx, cy = cluster
+        sides = []
+        if cy + 1 < self._cluster_cols:
+            sides.append((((cx, cy), (cx, cy + 1)), 0))
+        if cx + 1 < self._cluster_rows:
+            sides.append((((cx, cy), (cx + 1, cy)), 0))
+        if cy > 0:
+            sides.append((((cx, cy - 1), (cx, cy)), 1))
+        if cx > 0:
+            sides.append((((cx - 1, cy), (cx, cy)), 1))
+        return sides
+
+    def _regions_of(self, cluster):
+        """
+        The cluster's open cells split into connected regions, each a bitmask (see _bit).
+        """
+        regions = self._regions.get(cluster)
+        if regions is not None:
+            return regions
+
+        top, bottom, left, right = self._bounds(cluster)
+        remaining = self.map.open_mask(top, bottom, left, right)
+        stride = right - left + 1
+        regions = []
+        while remaining:
+            region = 0
+            for wavefront in wavefronts(remaining & -remaining, remaining, stride): # from the lowest open cell left
+                region |= wavefront
+            regions.append(region)
+            remaining ^= region
+        self._regions[cluster] = regions
+        return regions
+
+    def _bit(self, cluster, position):
+        # Bit of a cell in its cluster's masks: row-major with one spare bit per row
+        top, _, left, right = self._bounds(cluster)
+        return 1 << ((position[0] - top) * (right - left + 1) + position[1] - left)
+
+    def _region_mask(self, cluster, position):
+        bit = self._bit(cluster, position)
+        for region in self._regions_of(cluster):
+            if region & bit:
+                return region
+        return 0
+
+    def _border(self, border):
+        """
+        The entrances across the border between two clusters. Each open stretch of border
+        joins one region on either side and gets an entrance in its middle, or one at each
+        end if it is long.
+        """
+        transitions = self._borders.get(border)
+        if transitions is not None:
+            return transitions
+
+        first, second = border
+        size = self.cluster_size
+        game_map = self.map
+        if first[0] == second[0]:
+            # Side by side: the last column of the first cluster against the first of the second
+            y = second[1] * size
+            pairs = [((x, y - 1), (x, y)) for x in range(first[0] * size, min((first[0] + 1) * size, game_map.rows))]
+        else:
+            x = second[0] * size
+            pairs = [((x - 1, y), (x, y)) for y in range(first[1] * size, min((first[1] + 1) * size, game_map.cols))]
+
+        # Stretches joining the same two regions are only kept ENTRANCE_GAP apart;
+        # a shorter gap keeps whichever of the two stretches is longer
+        kept = {} # (region, region across) -> [(first index, last index)]
+        first_open = None
+        for index, pair in enumerate(pairs + [None]):
+            if pair is not None and not game_map.is_blocked(*pair[0]) and not game_map.is_blocked(*pair[1]):
+                if first_open is None:
+                    first_open = index
+                continue
+            if first_open is not None:
+                key = (self._region_mask(first, pairs[first_open][0]), self._region_mask(second, pairs[first_open][1]))
+                runs = kept.setdefault(key, [])
+                if not runs or first_open - runs[-1][1] >= ENTRANCE_GAP:
+                    runs.append((first_open, index - 1))
+                elif index - first_open > runs[-1][1] - runs[-1][0] + 1:
+                    runs[-1] = (first_open, index - 1)
+                first_open = None
+
+        transitions = []
+        for runs in kept.values():
+            for start, end in runs:
+                if end - start + 1 >= ENTRANCE_SPLIT:
+                    transitions.extend((pairs[start], pairs[end]))
+                else:
+                    transitions.append(pairs[(start + end) // 2])
+        self._borders[border] = transitions
+        return transitions
+
+    def _entrances(self, cluster):
+        """
+        {entrance cell: [(cell across the border, 1)]} for the cluster.
+        """
+        entrances = {}
+        for border, side in self._sides(cluster):
+            for transition in self._border(border):
+                entrances.setdefault(transition[side], []).append((transition[1 - side], 1))
+        return entrances
+
+    def _cluster_graph(self, cluster):
+        # Each entrance's edges: its hops across borders plus the distance to every entrance it can reach inside
+        graph = self._graphs.get(cluster)
+        if graph is None:
+            graph = self._graphs[cluster] = self._entrances(cluster)
+            entrances = list(graph)
+            for entrance in entrances:
+                reached = self._local_search(entrance, entrances)[0]
+                graph[entrance].extend((other, cost) for other, cost in reached.items() if other != entrance)
+        return graph
+
+    def _local_search(self, source, targets):
+        """
+        Breadth-first search from source that never leaves its cluster, run a whole
+        wavefront at a time on the region's bitmask. Stops once every target in source's
+        region is reached; the others cannot be. Returns ({target: distance}, wavefronts),
+        where wavefronts[d] holds the cells d steps from source.
+        """
+        cluster = self._cluster_of(source)
+        region = self._region_mask(cluster, source)
+        _, _, left, right = self._bounds(cluster)
+        stride = right - left + 1
+
+        wanted = {}
+        for target in targets:
+            bit = self._bit(cluster, target)
+            if region & bit:
+                wanted[bit] = target
+        wanted_mask = sum(wanted)
+
+        fronts = []
+        reached = {}
+        for frontier in wavefronts(self._bit(cluster, source), region, stride):
+            fronts.append(frontier)
+            hit = frontier & wanted_mask
+            if hit:
+                for bit in [bit for bit in wanted if hit & bit]:
+                    reached[wanted.pop(bit)] = len(fronts) - 1
+                wanted_mask &= ~hit
+                if not wanted_mask:
+                    break
+        return reached, fronts
+
+    def _local_path(self, start_position, end_position):
+        # Walks back from the end through ever earlier wavefronts
+        window = self._bounds(self._cluster_of(start_position))
+        reached, fronts = self._local_search(start_position, (end_position,))
+        path = [end_position]
+        for wavefront in reversed(fronts[:reached[end_position]]):
+            path.append(step_into(wavefront, path[-1], window))
+        return path[::-1]
+
+    def _abstract_path(self, start_position, end_position):
+        """
+        A* over the entrance graph with start and end spliced in.
+        Returns the waypoints from start to end, or None.
+        """
+        start_cluster = self._cluster_of(start_position)
+        end_cluster = self._cluster_of(end_position)
+
+        start_entrances = self._entrances(start_cluster)
+        targets = list(start_entrances)
+        if start_cluster == end_cluster:
+            targets.append(end_position)
+        start_edges = list(self._local_search(start_position, targets)[0].items())
+        start_edges.extend(start_entrances.get(start_position, ()))
+        goal_edges = self._local_search(end_position, list(self._entrances(end_cluster)))[0]
+
+        ex, ey = end_position
+        counter = 0
+        open_heap = [(abs(start_position[0] - ex) + abs(start_position[1] - ey), counter, start_position)]
+        best_g = {start_position: 0}
+        parents = {start_position: None}
+        closed = set()
+        route = None
+
+        while open_heap:
+            _, _, position = heapq.heappop(open_heap)
+            if position in closed:
+                continue
+            closed.add(position)
+            if position == end_position:
+                route = []
+                while position is not None:
+                    route.append(position)
+                    position = parents[position]
+                route.reverse()
+                break
+
+            if position == start_position:
+                neighbours = start_edges
+            else:
+                neighbours = self._cluster_graph(self._cluster_of(position)).get(position, ())
+                if position in goal_edges:
+                    neighbours = list(neighbours)
+                    neighbours.append((end_position, goal_edges[position]))
+
+            g = best_g[position]
+            for neighbour, cost in neighbours:
+                cost += g
+                if neighbour in closed or cost >= best_g.get(neighbour, cost + 1):
+                    continue
+                best_g[neighbour] = cost
+                parents[neighbour] = position
+                counter += 1
+                heapq.heappush(open_heap, (cost + abs(neighbour[0] - ex) + abs(neighbour[1] - ey), counter, neighbour))
+
+        if profiler.active is not None:
+            profiler.active.record_search("hpa_abstract", len(closed))
+        return route
+
+
+def path_finder(game_map, node_locations=None):
+    """
+    The path cache suited to the map: exact next-hop tables (built for every entry of
+    node_locations up front, if given) or, from HPA_MIN_CELLS up, a HierarchicalPathfinder.
+    """
+    if game_map.rows * game_map.cols >= HPA_MIN_CELLS:
+        return HierarchicalPathfinder(game_map)
+    if node_locations is None:
+        return PathCache(game_map) # tables are built on first use
+    return PathCache.for_nodes(game_map, node_locations)
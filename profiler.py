@@ -0,0 +1,163 @@
+import cProfile, os, signal, time
+from collections import Counter
+
+PROFILE_ENV = "LAST_PROTOCOL_PROFILE" # set to an output prefix to profile without the --profile flag
+SAMPLE_INTERVAL = 0.005 # seconds of CPU time between stack samples
+
+# The Profiler currently recording, if any. Hot paths only check this for None,
+# so leaving profiling off costs one attribute lookup per search.
+active = None
+
+
+class Profiler:
+    """
+    Opt-in instrumentation for a game session.
+
+    attach(state) wraps that state's step() to time every command and sample
+    the game's data structures after it: queue depths, history length, undo depth.
+    Pathfinding reports nodes expanded through record_search(). While running, the
+    whole process is also profiled with cProfile and a SIGPROF stack sampler.
+
+    dump() writes <prefix>.pstats (for pstats/snakeviz), <prefix>.collapsed
+    (flamegraph.pl / speedscope format) and a text report to <prefix>.txt.
+    Nothing here runs unless profiling is asked for.
+    """
+
+    def __init__(self, prefix="last_protocol_profile", use_cprofile=True, sample_interval=SAMPLE_INTERVAL):
+        self.prefix = prefix
+        self.commands = {} # name -> [calls, total seconds, slowest]
+        self.gauges = {} # name -> [samples, total, max]
+        self.searches = {} # kind -> [searches, nodes expanded, most in one search]
+        self.stacks = Counter() # "outer;inner;leaf" -> samples
+        self.sample_interval = sample_interval
+        self._cprofile = cProfile.Profile() if use_cprofile else None
+        self._sampling = False
+        self._started = None
+
+    def start(self):
+        global active
+        active = self
+        self._started = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        # SIGPROF fires on CPU time, so an idle game waiting at input() takes no samples
+        if hasattr(signal, "setitimer") and self.sample_interval:
+            try:
+                signal.signal(signal.SIGPROF, self._sample)
+                signal.setitimer(signal.ITIMER_PROF, self.sample_interval, self.sample_interval)
+                self._sampling = True
+            except ValueError:
+                pass # not the main thread; run without stack samples
+        return self
+
+    def stop(self):
+        global active
+        if self._sampling:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+            self._sampling = False
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if active is self:
+            active = None
+
+    def attach(self, state):
+        """
+        Times every step() of a GameState. The wrapper lives on the instance,
+        so unprofiled states run the plain method.
+        """
+        step = state.step
+
+        def timed_step(command, answers=()):
+            name = self._command_name(state, command)
+            started = time.perf_counter()
+            events = step(command, answers)
+            self._record(self.commands, name, time.perf_counter() - started)
+            self._sample_state(state)
+            return events
+
+        state.step = timed_step
+        return state
+
+    def record_search(self, kind, expanded):
+        entry = self.searches.setdefault(kind, [0, 0, 0])
+        entry[0] += 1
+        entry[1] += expanded
+        entry[2] = max(entry[2], expanded)
+
+    def _command_name(self, state, command):
+        if state.awaiting_input:
+            return "(answer)"
+        if state.final_ready:
+            return "(final protocol)"
+        words = command.split()
+        found = state.router.resolve(words[0]) if words else None
+        return found.name if hasattr(found, "name") else "(unknown)"
+
+    def _sample_state(self, state):
+        gauges = self.gauges
+        self._record(gauges, "npc_queue", len(state.npc_queue))
+        self._record(gauges, "drone_queue", len(state.drone_queue))
+        self._record(gauges, "history", len(state.history))
+        self._record(gauges, "undo_log", len(state.undo_log))
+
+    def _record(self, table, name, value):
+        entry = table.get(name)
+        if entry is None:
+            entry = table[name] = [0, 0, value]
+        entry[0] += 1
+        entry[1] += value
+        if value > entry[2]:
+            entry[2] = value
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+    def report(self):
+        lines = [f"Profiled for {time.perf_counter() - self._started:.2f}s"]
+        if self.commands:
+            lines.append("\nCommand              calls    mean ms     max ms")
+            for name, (calls, total, slowest) in sorted(self.commands.items(), key=lambda item: -item[1][1]):
+                lines.append(f"{name:<18} {calls:>7} {total / calls * 1000:>10.3f} {slowest * 1000:>10.3f}")
+        if self.gauges:
+            lines.append("\nDepth after each command   mean      max")
+            for name, (samples, total, peak) in self.gauges.items():
+                lines.append(f"{name:<22} {total / samples:>10.1f} {peak:>8}")
+        if self.searches:
+            lines.append("\nSearch           searches  nodes/search   max nodes")
+            for kind, (searches, expanded, most) in self.searches.items():
+                lines.append(f"{kind:<16} {searches:>9} {expanded / searches:>13.1f} {most:>11}")
+        return "\n".join(lines)
+
+    def dump(self):
+        """
+        Stops profiling and writes the output files. Returns the report text.
+        """
+        self.stop()
+        report = self.report()
+        written = []
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.prefix + ".pstats")
+            written.append(self.prefix + ".pstats")
+        if self.stacks:
+            with open(self.prefix + ".collapsed", "w") as collapsed_file:
+                for stack, samples in self.stacks.most_common():
+                    collapsed_file.write(f"{stack} {samples}\n")
+            written.append(self.prefix + ".collapsed")
+        with open(self.prefix + ".txt", "w") as report_file:
+            report_file.write(report + "\n")
+        written.append(self.prefix + ".txt")
+        return report + "\n\nProfile written to " + ", ".join(written)
+
+
+def from_environment(flag=None):
+    """
+    A started Profiler if the --profile flag value or PROFILE_ENV asks for one, else None.
+    """
+    prefix = flag or os.environ.get(PROFILE_ENV)
+    return Profiler(prefix).start() if prefix else None
@@ -0,0 +1,292 @@
+from collections import Counter
+from itertools import islice
+from grid import OBSTACLE, step_into, wavefronts
+
+numpy = None # imported by the first field big enough to use it (see _load_numpy)
+_numpy_tried = False
+
+PURSUIT_RADIUS = 24 # moves from the player the flow field reaches; pursuers farther out home in by compass
+SPAWN_DISTANCE = 8 # new pursuers appear this many moves from the player (or as far as the map allows)
+SPEEDS = {"drone": 2, "crowd": 1} # moves per turn
+SYMBOLS = {"drone": "!", "crowd": "n"} # map markers
+# Windows with fewer cells use bitmasks even when NumPy is installed. Bitmasks build the field
+# faster at every size; NumPy only wins on stepping a dozen pursuers across a field this big.
+NUMPY_MIN_CELLS = 150 * 1000
+
+
+def _load_numpy():
+    # Imported on demand: it costs ~100 ms at startup, and the usual 49x49 field never needs it
+    global numpy, _numpy_tried
+    if not _numpy_tried:
+        _numpy_tried = True
+        try:
+            import numpy
+        except ImportError:
+            pass # optional; the bitmask wavefront needs nothing beyond the standard library
+    return numpy
+
+
+class FlowField:
+    """
+    Distance to one target (the player) for every cell within `radius` moves of it,
+    recomputed with update() once per turn. Any number of agents then follow it
+    downhill in one batched step_all() call instead of a path search each.
+
+    Each wavefront is a bitmask in a Python int (one bit per cell of the window, one
+    spare bit per row; see grid.wavefronts). A field whose window can reach
+    NUMPY_MIN_CELLS cells uses an int32 array grown by whole-array shifts instead,
+    if NumPy is installed. Both give the same distances and move agents identically.
+    """
+
+    def __init__(self, game_map, radius=PURSUIT_RADIUS, use_numpy=None):
+        self.map = game_map
+        self.radius = radius
+        if use_numpy is None:
+            side = 2 * radius + 1
+            use_numpy = min(side, game_map.rows) * min(side, game_map.cols) >= NUMPY_MIN_CELLS
+        self.use_numpy = use_numpy and _load_numpy() is not None
+        self.target = None
+        self._layout = None # map version the field was built for
+        self._window = None # (top, bottom, left, right)
+        self._distance = None # numpy: distance array for the window, -1 where unreached
+        self._wavefronts = None # otherwise: wavefronts[d] is the bitmask of cells d moves away
+        self._open_cells = None # ((window, map version), bitmask of the window's open cells)
+
+    def update(self, target):
+        game_map = self.map
+        if target == self.target and game_map.version == self._layout:
+            return # nobody moved the target or an obstacle; the field still holds
+        radius = self.radius
+        top, bottom = max(target[0] - radius, 0), min(target[0] + radius + 1, game_map.rows)
+        left, right = max(target[1] - radius, 0), min(target[1] + radius + 1, game_map.cols)
+        self.target = target
+        self._layout = game_map.version
+        self._window = (top, bottom, left, right)
+        if self.use_numpy:
+            self._expand_array()
+        else:
+            self._expand_bits()
+
+    def _expand_array(self):
+        top, bottom, left, right = self._window
+        game_map = self.map
+        cells = numpy.frombuffer(game_map.cells, dtype=numpy.uint8).reshape(game_map.rows, game_map.cols) # a view, no copy
+        open_cells = cells[top:bottom, left:right] != OBSTACLE
+
+        distance = numpy.full(open_cells.shape, -1, dtype=numpy.int32)
+        frontier = numpy.zeros(open_cells.shape, dtype=bool)
+        frontier[self.target[0] - top, self.target[1] - left] = True
+        distance[frontier] = 0
+        seen = frontier.copy()
+        for step in range(1, self.radius + 1):
+            grown = numpy.zeros_like(frontier)
+            grown[1:, :] |= frontier[:-1, :]
+            grown[:-1, :] |= frontier[1:, :]
+            grown[:, 1:] |= frontier[:, :-1]
+            grown[:, :-1] |= frontier[:, 1:]
+            grown &= open_cells
+            grown &= ~seen
+            if not grown.any():
+                break
+            distance[grown] = step
+            seen |= grown
+            frontier = grown
+        self._distance = distance
+
+    def _expand_bits(self):
+        top, bottom, left, right = self._window
+        if self._open_cells is None or self._open_cells[0] != (self._window, self._layout):
+            # Small maps fit in one window, so the open-cell mask is usually reused turn after turn
+            self._open_cells = ((self._window, self._layout), self.map.open_mask(top, bottom, left, right))
+
+        stride = right - left + 1
+        start = 1 << ((self.target[0] - top) * stride + self.target[1] - left)
+        self._wavefronts = list(islice(wavefronts(start, self._open_cells[1], stride), self.radius + 1))
+
+    def distance(self, position):
+        """
+        Moves from position to the target, or None if it is beyond the field.
+        """
+        top, bottom, left, right = self._window
+        x, y = position
+        if not (top <= x < bottom and left <= y < right):
+            return None
+        if self.use_numpy:
+            value = int(self._distance[x - top, y - left])
+            return None if value < 0 else value
+        bit = 1 << ((x - top) * (right - left + 1) + y - left)
+        for steps, wavefront in enumerate(self._wavefronts):
+            if wavefront & bit:
+                return steps
+        return None
+
+    def ring(self, steps):
+        """
+        The cells exactly `steps` moves from the target, in row-major order.
+        """
+        top, _, left, right = self._window
+        if self.use_numpy:
+            return [(int(x) + top, int(y) + left) for x, y in numpy.argwhere(self._distance == steps)]
+        if steps >= len(self._wavefronts):
+            return []
+        wavefront, stride = self._wavefronts[steps], right - left + 1
+        cells = []
+        while wavefront:
+            bit = wavefront & -wavefront
+            x, y = divmod(bit.bit_length() - 1, stride)
+            cells.append((top + x, left + y))
+            wavefront ^= bit
+        return cells
+
+    @property
+    def reach(self):
+        """
+        The largest distance in the field.
+        """
+        if self.use_numpy:
+            return int(self._distance.max())
+        return len(self._wavefronts) - 1
+
+    def step_all(self, positions, speeds):
+        """
+        Moves every agent up to its speed in moves towards the target, stopping next to it.
+        Inside the field each move goes to the first neighbour (west, east, north, south)
+        one step closer; outside it agents head straight for the target by compass.
+        Returns the new positions.
+        """
+        if self.use_numpy and positions:
+            moved = self._step_array(positions, speeds)
+        else:
+            moved = [self._step_one(position, speed) for position, speed in zip(positions, speeds)]
+        return moved
+
+    def _step_one(self, position, speed):
+        for _ in range(speed):
+            steps = self.distance(position)
+            if steps is None:
+                position = self._home(position)
+                continue
+            if steps <= 1:
+                break
+            position = step_into(self._wavefronts[steps - 1], position, self._window) or position
+        return position
+
+    def _step_array(self, positions, speeds):
+        top, bottom, left, right = self._window
+        distance = self._distance
+        rows, cols = distance.shape
+        xs = numpy.array([position[0] for position in positions]) - top
+        ys = numpy.array([position[1] for position in positions]) - left
+        speeds = numpy.array(speeds)
+
+        for turn in range(int(speeds.max())):
+            inside = (xs >= 0) & (xs < rows) & (ys >= 0) & (ys < cols)
+            current = numpy.where(inside, distance[xs.clip(0, rows - 1), ys.clip(0, cols - 1)], -1)
+            outside = (speeds > turn) & (current < 0)
+            moving = (speeds > turn) & (current > 1)
+
+            best_x, best_y, best = xs.copy(), ys.copy(), current.copy()
+            for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+                nx, ny = xs + dx, ys + dy
+                valid = moving & (nx >= 0) & (nx < rows) & (ny >= 0) & (ny < cols)
+                steps = numpy.where(valid, distance[nx.clip(0, rows - 1), ny.clip(0, cols - 1)], -1)
+                better = valid & (steps >= 0) & (steps < best)
+                best_x = numpy.where(better, nx, best_x)
+                best_y = numpy.where(better, ny, best_y)
+                best = numpy.where(better, steps, best)
+            xs, ys = best_x, best_y
+
+            # The few agents beyond the field home in one at a time
+            for index in numpy.flatnonzero(outside):
+                x, y = self._home((int(xs[index]) + top, int(ys[index]) + left))
+                xs[index], ys[index] = x - top, y - left
+        return [(int(x) + top, int(y) + left) for x, y in zip(xs, ys)]
+
+    def _home(self, position):
+        # One move along the axis with the larger gap to the target, or the other if that is blocked
+        x, y = position
+        tx, ty = self.target
+        dx, dy = (tx > x) - (tx < x), (ty > y) - (ty < y)
+        options = ((x + dx, y), (x, y + dy)) if abs(tx - x) >= abs(ty - y) else ((x, y + dy), (x + dx, y))
+        for step in options:
+            if step != position and not self.map.is_blocked(*step):
+                return step
+        return position
+
+
+class Pursuers:
+    """
+    Puts the drone and crowd queues on the map. Each queued drone or crowd gets a
+    pursuer that appears SPAWN_DISTANCE moves from the player and closes in every
+    turn along a shared FlowField. The queues still decide what drones and crowds do;
+    pursuers only give them a place, shown on the map and in drone warnings.
+    Nothing here draws on the game's random numbers, so seeded games play out as before.
+    """
+
+    def __init__(self, game_map, radius=PURSUIT_RADIUS, use_numpy=None):
+        self.field = FlowField(game_map, radius, use_numpy)
+        self.agents = [] # (kind, label, position), oldest first
+        self._queues = None # queue contents the agents were last matched to
+
+    def update(self, npc_queue, drone_queue, player_position):
+        """
+        Matches the pursuers to the queues, then moves them all. Called once per turn.
+        """
+        queues = (tuple(npc_queue), tuple(drone_queue.items()))
+        if not self.agents and not queues[0] and not queues[1]:
+            return
+        self.field.update(player_position)
+        if queues != self._queues:
+            self._queues = queues
+            self._match(*queues)
+        if self.agents:
+            positions = self.field.step_all([agent[2] for agent in self.agents],
+                                            [SPEEDS[agent[0]] for agent in self.agents])
+            self.agents = [(kind, label, position) for (kind, label, _), position in zip(self.agents, positions)]
+
+    def _match(self, crowds, drones):
+        wanted = Counter(("crowd", crowd) for crowd in crowds)
+        wanted.update(("drone", drone) for _, drone in drones)
+
+        # Queues let go of their oldest entries first, so the newest pursuers are the ones kept
+        kept = []
+        for agent in reversed(self.agents):
+            if wanted[agent[:2]] > 0:
+                wanted[agent[:2]] -= 1
+                kept.append(agent)
+        kept.reverse()
+
+        wanted = +wanted
+        if wanted:
+            field = self.field
+            ring = field.ring(min(SPAWN_DISTANCE, field.reach)) or [field.target]
+            for (kind, label), count in wanted.items():
+                for _ in range(count):
+                    kept.append((kind, label, ring[len(kept) * 7 % len(ring)])) # spread out around the ring
+        self.agents = kept
+
+    def distance_to(self, label):
+        """
+        Moves between the player and the nearest pursuer with this label, or None.
+        """
+        if self.field.target is None:
+            return None
+        distances = [self.field.distance(position) for _, name, position in self.agents if name == label]
+        distances = [steps for steps in distances if steps is not None]
+        return min(distances) if distances else None
+
+    def markers(self):
+        """
+        {position: map symbol} for every pursuer; drones are drawn over crowds.
+        """
+        markers = {}
+        for kind, _, position in sorted(self.agents, key=lambda agent: agent[0] == "drone"):
+            markers[position] = SYMBOLS[kind]
+        return markers
+
+    def snapshot(self):
+        return tuple(self.agents)
+
+    def restore(self, agents):
+        self.agents = list(agents)
+        self._queues = None
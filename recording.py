@@ -0,0 +1,172 @@
+import base64, json, sys, zlib
+
+from engine import GameState
+from grid import generate_city
+from journal import replay
+from savegame import SaveError, dumps, restore
+
+RECORDING_VERSION = 1
+
+
+class Recorder:
+    """
+    Records a session so it can be replayed exactly, without anyone at the keyboard.
+
+    A game is deterministic given its seed, city and settings, so those go in a header
+    and then each state-changing command is written with the answers it consumed,
+    one JSON line apiece:
+
+        {"recording": 1, "seed": 1234, "campaign": "kathmandu", "city": [200, 300], "settings": {...}, "player": "Ada"}
+        ["move north", []]
+        ["hack", ["Router", "Firewall"]]
+        {"load": "<base64 save>"}          (the game 'load' brought in from outside)
+        {"end": {"turns": 2, "outcome": null, "checksum": 2915873010}}
+
+    The end line holds a crc32 of the final save, so replay_recording() can tell whether
+    the replay came out bit-for-bit the same.
+
+    It stands in as state.journal; a crash-recovery Journal passed as `inner` keeps
+    receiving every record and checkpoint as before.
+    """
+
+    def __init__(self, path, state, city_size=None, player=None, inner=None, snapshot=False):
+        self.path = path
+        self.inner = inner
+        self._state = state
+        self._file = open(path, "w", encoding="utf-8")
+        settings = dict(state.settings, hack_answers=list(state.settings["hack_answers"]))
+        self._write({"recording": RECORDING_VERSION, "seed": state.seed, "campaign": state.campaign,
+                     "city": list(city_size) if city_size else None, "settings": settings, "player": player})
+        if snapshot:
+            self._write({"snapshot": _encode_state(state)}) # e.g. a recovered session, which the seed alone cannot rebuild
+        state.journal = self
+
+    def record(self, command, answers=()):
+        if self.inner is not None:
+            self.inner.record(command, answers)
+        self._write([command, list(answers)])
+
+    def checkpoint(self):
+        # Only the load command checkpoints mid-game
+        if self.inner is not None:
+            self.inner.checkpoint()
+        self._write({"load": _encode_state(self._state)})
+
+    def close(self):
+        if self._file is None:
+            return
+        state = self._state
+        try:
+            checksum = zlib.crc32(dumps(state))
+        except SaveError:
+            checksum = None # stopped in the middle of a prompt; only turns and outcome can be compared
+        self._write({"end": {"turns": state.turns, "outcome": state.outcome, "checksum": checksum}})
+        self._file.close()
+        self._file = None
+        if self.inner is not None:
+            self.inner.close()
+
+    def _write(self, entry):
+        # One line per entry, flushed straight away so a crash keeps everything up to the last command
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+
+def _encode_state(state):
+    return base64.b64encode(dumps(state)).decode("ascii")
+
+
+def load_recording(path):
+    """
+    Returns (header, entries, end) from a recording. A truncated last line, as left by
+    a crash, is dropped and end is None.
+    """
+    with open(path, encoding="utf-8") as recording_file:
+        lines = recording_file.read().splitlines()
+    if not lines:
+        raise ValueError(f"{path} is empty")
+    header = json.loads(lines[0])
+    if header.get("recording") != RECORDING_VERSION:
+        raise ValueError(f"{path} is not a Last Protocol recording")
+
+    entries, end = [], None
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            break
+        if isinstance(entry, dict) and "end" in entry:
+            end = entry["end"]
+            break
+        entries.append(entry)
+    return header, entries, end
+
+
+def replay_recording(path, out=None):
+    """
+    Rebuilds the recorded game from its seed and replays every command.
+    Output is switched off unless `out` (e.g. print) is given.
+    Returns (state, end) where end is the recording's end line, or None if it has none.
+    """
+    header, entries, end = load_recording(path)
+    settings = dict(header["settings"])
+    settings["hack_answers"] = tuple(settings["hack_answers"])
+    seed = header["seed"]
+    city = generate_city(*header["city"], seed=seed) if header["city"] else None
+    state = GameState(seed=seed, city=city, settings=settings, out=out, interactive=True,
+                      campaign=header.get("campaign"))
+
+    batch = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            batch.append(entry)
+            continue
+        _replay(state, batch, out)
+        batch = []
+        restore(state, base64.b64decode(entry.get("snapshot") or entry["load"]))
+    _replay(state, batch, out)
+    return state, end
+
+
+def _replay(state, entries, out):
+    if out is None:
+        replay(state, [(None, command, answers) for command, answers in entries])
+        return
+    for command, answers in entries:
+        out(f"\n> {command}")
+        state.step(command, answers)
+
+
+def matches(state, end):
+    """
+    Whether a replayed state is the one the recording ended with.
+    """
+    if end is None:
+        return None
+    if end["checksum"] is None or state.awaiting_input:
+        return (state.turns, state.outcome) == (end["turns"], end["outcome"])
+    return zlib.crc32(dumps(state)) == end["checksum"]
+
+
+def main(argv=None):
+    """
+    python recording.py <file> [--show] replays a recording and checks it against its end line.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    paths = [arg for arg in argv if arg != "--show"]
+    if len(paths) != 1:
+        sys.exit("usage: python recording.py <recording> [--show]")
+    state, end = replay_recording(paths[0], out=print if "--show" in argv else None)
+
+    print(f"Replayed {state.turns} turns (seed {state.seed}), outcome: {state.outcome or 'none yet'}")
+    result = matches(state, end)
+    if result is None:
+        print("The recording has no end line (the session did not close), so there is nothing to check against.")
+    elif result:
+        print("Replay matches the recorded session.")
+    else:
+        sys.exit("Replay does NOT match the recorded session.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import sys
+
+DEFAULT_TITLE = "The Last Protocol"
+LEGEND_SYMBOLS = [
+    "[!]: Pursuing drone",
+    "[n]: NPC crowd",
+    "[X]: Obstacle",
+    "[.]: Empty"
+]
+
+ROW_CACHE_LIMIT = 4096
+
+
+class MapRenderer:
+    """
+    Draws an N x M window of the map centred on the player.
+    Each frame is built with a single join, row strings are cached between frames
+    and only rebuilt when the cells under them (or the player marker) change.
+    Each game keeps its own renderer, so the cache follows that player's window.
+    `title` heads every frame and `places` is the (symbol, name) pairs the legend lists,
+    both from the game's campaign.
+    """
+
+    def __init__(self, view_rows=9, view_cols=11, title=DEFAULT_TITLE, places=()):
+        self.view_rows = view_rows
+        self.view_cols = view_cols
+        self.title = title
+        self.legend_items = ["[*]: Your Position"] + [f"[{symbol}]: {name}" for symbol, name in places] + LEGEND_SYMBOLS
+        self._row_cache = {} # (row, first col, last col) -> (cell bytes, player col, rendered line, markers)
+
+    def window(self, game_map, player_position):
+        """
+        Returns (top, left, bottom, right) of the viewport, clamped to the map edges.
+        """
+        rows = min(self.view_rows, game_map.rows)
+        cols = min(self.view_cols, game_map.cols)
+        top = min(max(player_position[0] - rows // 2, 0), game_map.rows - rows)
+        left = min(max(player_position[1] - cols // 2, 0), game_map.cols - cols)
+        return top, left, top + rows, left + cols
+
+    def frame_lines(self, game_map, player_position, location_names, legend=True, markers=None):
+        """
+        Builds the full frame (header, map window and optional legend) as a list of lines.
+        markers maps positions to symbols drawn over the cells (the player's marker wins).
+        """
+        location_display = location_names.get(player_position, "Unknown Sector")
+        lines = [
+            "",
+            "-"*40,
+            "|{:^38}|".format("▲ North"),
+            "-"*40,
+            "|{:^38}|".format(self.title),
+            "|    Location: {:<24}|".format(location_display),
+            "-"*40
+        ]
+
+        top, left, bottom, right = self.window(game_map, player_position)
+        if (bottom - top, right - left) != (game_map.rows, game_map.cols):
+            lines.append("|{:^38}|".format(f"rows {top}-{bottom - 1}, cols {left}-{right - 1}"))
+        row_markers = {}
+        for (x, y), symbol in (markers or {}).items():
+            if top <= x < bottom and left <= y < right:
+                row_markers.setdefault(x, []).append((y - left, symbol))
+        for x in range(top, bottom):
+            lines.append(self._row_line(game_map, x, left, right, player_position, tuple(sorted(row_markers.get(x, ())))))
+        lines.append("-"*40)
+
+        if legend:
+            lines += ["", "-"*40, "|{:^38}|".format("--- Map Legend ---")]
+            lines += ["| {:<37}|".format(item) for item in self.legend_items]
+            lines.append("-"*40)
+        return lines
+
+    def render(self, game_map, player_position, location_names, legend=True, markers=None):
+        """
+        Returns the text to write for this frame.
+        """
+        return "\n".join(self.frame_lines(game_map, player_position, location_names, legend, markers)) + "\n"
+
+    def draw(self, game_map, player_position, location_names, legend=True, stream=None, markers=None):
+        stream = stream or sys.stdout
+        stream.write(self.render(game_map, player_position, location_names, legend, markers))
+        stream.flush()
+
+    def _row_line(self, game_map, x, left, right, player_position, markers=()):
+        cells = game_map.cells[x * game_map.cols + left:x * game_map.cols + right]
+        player_col = player_position[1] - left if player_position[0] == x else -1
+
+        key = (x, left, right)
+        cached = self._row_cache.get(key)
+        if cached is not None and cached[0] == cells and cached[1] == player_col and cached[3] == markers:
+            return cached[2]
+
+        if len(self._row_cache) > ROW_CACHE_LIMIT:
+            self._row_cache.clear() # the player wandered far; old windows are unlikely to come back
+
+        symbols = list(cells.decode())
+        for col, symbol in markers:
+            symbols[col] = symbol
+        if player_col >= 0:
+            symbols[player_col] = "*"
+        line = "| " + "  ".join(symbols) + " |"
+        self._row_cache[key] = (bytes(cells), player_col, line, markers)
+        return line
@@ -0,0 +1,403 @@
+import json, struct, sys, zlib
+
+from data_structures import LinkedList, Queue, PriorityQueue
+from campaign import CampaignError, DEFAULT_CAMPAIGN, load_campaign
+from engine import DEFAULT_SETTINGS, GameState
+from grid import Grid
+from locations import LocationRegistry
+from pathfinding import path_finder
+from pursuit import Pursuers
+from renderer import MapRenderer
+from undo import UndoLog
+
+MAGIC = b"TLPS"
+FORMAT_VERSION = 4 # 2: full undo/redo log instead of a stack of positions; 3: pursuer positions; 4: campaign
+DEFAULT_SAVE_FILE = "last_protocol.sav"
+
+# Flag bits of a location record
+HACKED = 1
+UNLOCKED = 2
+
+
+class SaveError(Exception):
+    pass
+
+
+class _Writer:
+    """
+    Builds the save file body. Every string goes through a string table, so the
+    thousands of repeated history lines ("Moved north to ...") are stored once
+    and referenced by a varint index.
+    """
+
+    def __init__(self):
+        self.body = bytearray()
+        self.strings = {}
+
+    def varint(self, value):
+        # LEB128: 7 bits per byte, high bit set while more bytes follow
+        body = self.body
+        while value > 0x7F:
+            body.append((value & 0x7F) | 0x80)
+            value >>= 7
+        body.append(value)
+
+    def signed(self, value):
+        self.varint(value << 1 if value >= 0 else (-value << 1) - 1) # zigzag encoding
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = len(self.strings)
+        self.varint(index)
+
+    def optional_string(self, text):
+        if text is None:
+            self.varint(0)
+        else:
+            self.body.append(1)
+            self.string(text)
+
+    def position(self, position):
+        self.varint(position[0])
+        self.varint(position[1])
+
+    def blob(self, data):
+        self.varint(len(data))
+        self.body += data
+
+    def string_table(self):
+        table = _Writer()
+        table.varint(len(self.strings))
+        for text in self.strings: # dicts keep insertion order, which is the index order
+            table.blob(text.encode())
+        return table.body
+
+
+class _Reader:
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+        self.strings = []
+
+    def varint(self):
+        data = self.data
+        result = shift = 0
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def signed(self):
+        value = self.varint()
+        return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+    def string(self):
+        return self.strings[self.varint()]
+
+    def optional_string(self):
+        return self.string() if self.data[self._advance()] else None
+
+    def position(self):
+        return (self.varint(), self.varint())
+
+    def blob(self):
+        size = self.varint()
+        start = self.pos
+        self.pos += size
+        return self.data[start:self.pos]
+
+    def read_string_table(self):
+        self.strings = [self.blob().decode() for _ in range(self.varint())]
+
+    def _advance(self):
+        self.pos += 1
+        return self.pos - 1
+
+
+def dumps(state):
+    """
+    Serialises a GameState to the compact binary save format:
+
+        magic, version (u16)
+        string table (count, then length-prefixed UTF-8 strings)
+        zlib-compressed body of varints referencing the string table
+
+    The map is stored as its raw cell bytes, so zlib squeezes large mostly-empty cities down to little.
+    """
+    if state.awaiting_input:
+        raise SaveError("Finish the current prompt before saving.")
+
+    w = _Writer()
+
+    w.string(json.dumps(state.settings, sort_keys=True))
+    w.signed(state.seed if isinstance(state.seed, int) else -1)
+    version, internal, gauss = state.rng.getstate()
+    w.varint(version)
+    w.blob(struct.pack(f"<{len(internal)}I", *internal))
+    w.optional_string(None if gauss is None else repr(gauss))
+
+    grid = state.game_map
+    w.varint(grid.rows)
+    w.varint(grid.cols)
+    w.blob(bytes(grid.cells))
+
+    w.position(state.player_position)
+    w.varint(state.turns)
+    w.optional_string(state.outcome)
+    w.varint(int(state.final_ready))
+
+    w.varint(len(state.inventory))
+    for item in state.inventory:
+        w.string(item)
+
+    locations = state.node_locations
+    w.varint(len(locations))
+    for key, record in locations.items():
+        w.string(key)
+        w.string(record['type'])
+        w.position((record['x'], record['y']))
+        w.varint((HACKED if record.get('hacked') else 0) | (UNLOCKED if record.get('unlocked') else 0))
+    w.varint(len(locations.names))
+    for position, name in locations.names.items():
+        w.position(position)
+        w.string(name)
+
+    history = state.history
+    w.varint(history.max_length or 0)
+    w.varint(history.evicted)
+    w.varint(len(history))
+    for entry in history:
+        w.string(entry)
+
+    w.string(json.dumps(state.undo_log.export(), separators=(",", ":")))
+
+    npc_queue = state.npc_queue
+    w.varint(npc_queue.capacity)
+    w.varint(int(npc_queue.bounded))
+    w.varint(npc_queue.dropped)
+    w.varint(len(npc_queue))
+    for crowd in npc_queue:
+        w.string(crowd)
+
+    drone_queue = state.drone_queue
+    w.varint(drone_queue.max_size or 0)
+    w.string(drone_queue.overflow)
+    drones = drone_queue.items()
+    w.varint(len(drones))
+    for priority, drone in drones:
+        w.signed(priority)
+        w.string(drone)
+
+    w.varint(len(state.pursuers.agents))
+    for kind, label, position in state.pursuers.agents:
+        w.string(kind)
+        w.string(label)
+        w.position(position)
+
+    w.string(state.campaign)
+
+    header = MAGIC + struct.pack("<H", FORMAT_VERSION)
+    return header + zlib.compress(bytes(w.string_table() + w.body), 6)
+
+
+def loads(data, **state_options):
+    """
+    Rebuilds a GameState from bytes produced by dumps(). Extra keyword arguments
+    (out, read, interactive, ...) are passed to GameState.
+    """
+    state = GameState(city=_placeholder_city(), precompute_paths=False, **state_options)
+    restore(state, data)
+    return state
+
+
+def restore(state, data):
+    """
+    Overwrites an existing GameState with a saved one, e.g. for the in-game 'load' command.
+    """
+    try:
+        return _restore(state, *_open(data))
+    except (IndexError, KeyError, ValueError, struct.error) as error:
+        raise SaveError(f"Save file is corrupted: {error}")
+
+
+def _restore(state, r, version):
+
+    settings = dict(DEFAULT_SETTINGS, **json.loads(r.string()))
+    settings["hack_answers"] = tuple(settings["hack_answers"])
+    seed = r.signed()
+    rng_version = r.varint()
+    internal = r.blob()
+    gauss = r.optional_string()
+    rng_state = (rng_version, struct.unpack(f"<{len(internal) // 4}I", internal),
+                 None if gauss is None else float(gauss))
+
+    rows, cols = r.varint(), r.varint()
+    grid = Grid(0, 0)
+    grid.rows, grid.cols, grid.cells = rows, cols, bytearray(r.blob())
+
+    player_position = r.position()
+    turns = r.varint()
+    outcome = r.optional_string()
+    final_ready = bool(r.varint())
+
+    inventory = [r.string() for _ in range(r.varint())]
+
+    node_locations = {}
+    for _ in range(r.varint()):
+        key, location_type = r.string(), r.string()
+        x, y = r.position()
+        flags = r.varint()
+        record = {"x": x, "y": y, "type": location_type}
+        if location_type == "node":
+            record["hacked"] = bool(flags & HACKED)
+        elif location_type == "hub":
+            record["unlocked"] = bool(flags & UNLOCKED)
+        node_locations[key] = record
+    location_names = {}
+    for _ in range(r.varint()):
+        position = r.position()
+        location_names[position] = r.string()
+
+    history = LinkedList(max_length=r.varint() or None)
+    evicted = r.varint()
+    for _ in range(r.varint()):
+        history.append(r.string())
+    history.evicted = evicted
+
+    if version == 1:
+        for _ in range(r.varint()): # old saves only kept positions; they start with an empty undo log
+            r.position()
+        undo_log = UndoLog(settings["undo_depth"])
+    else:
+        undo_log = UndoLog.from_export(json.loads(r.string()))
+
+    npc_queue = Queue(capacity=r.varint(), bounded=bool(r.varint()))
+    npc_queue.dropped = r.varint()
+    npc_queue.enqueue_many([r.string() for _ in range(r.varint())])
+
+    drone_queue = PriorityQueue(max_size=r.varint() or None, overflow=r.string())
+    for _ in range(r.varint()):
+        priority = r.signed()
+        drone_queue.enqueue(r.string(), priority)
+
+    # Older saves have no pursuers; they appear for the queued crowds and drones after the next turn
+    pursuers = Pursuers(grid)
+    if version >= 3:
+        pursuers.restore((r.string(), r.string(), r.position()) for _ in range(r.varint()))
+
+    # The map is in the save; the campaign still supplies the story and help text
+    campaign = r.string() if version >= 4 else DEFAULT_CAMPAIGN
+    try:
+        content = load_campaign(campaign)
+    except CampaignError as error:
+        raise SaveError(f"This save needs a campaign that is not available: {error}")
+
+    if r.pos != len(r.data):
+        raise SaveError("Save file has trailing data; it may be corrupted.")
+
+    # Everything parsed; only now touch the live state so a bad file leaves it intact
+    state.settings = settings
+    state.seed = None if seed < 0 else seed
+    state.rng.setstate(rng_state)
+    state.player_position = player_position
+    state.turns = turns
+    state.outcome = outcome
+    state.final_ready = final_ready
+    state.inventory = inventory
+    state.game_map = grid
+    state.node_locations = LocationRegistry(node_locations, location_names)
+    state.location_names = state.node_locations.names
+    state.hub_key = state.node_locations.hub()
+    state.hub_position = state.node_locations.position_of(state.hub_key)
+    state.path_cache = path_finder(grid) # tables for the loaded map are built on first use
+    state.history = history
+    state.undo_log = undo_log
+    state.npc_queue = npc_queue
+    state.drone_queue = drone_queue
+    state.pursuers = pursuers
+    state.campaign = campaign
+    state.title = content["title"]
+    state.renderer = MapRenderer(title=state.title, places=state.node_locations.legend(grid))
+    state.story_text = content["story"]
+    state.help_text = content["help"]
+    return state
+
+
+def save_game(state, path=DEFAULT_SAVE_FILE):
+    data = dumps(state)
+    with open(path, "wb") as save_file:
+        save_file.write(data)
+    return len(data)
+
+
+def load_game(path=DEFAULT_SAVE_FILE, **state_options):
+    with open(path, "rb") as save_file:
+        return loads(save_file.read(), **state_options)
+
+
+def export_json(state):
+    """
+    A readable dump of the full state for debugging. It is not meant to be loaded back.
+    """
+    return {
+        "seed": state.seed,
+        "campaign": state.campaign,
+        "settings": state.settings,
+        "turns": state.turns,
+        "outcome": state.outcome,
+        "player_position": state.player_position,
+        "map": state.game_map.rows_as_strings(),
+        "inventory": state.inventory,
+        "locations": dict(state.node_locations.items()),
+        "location_names": {f"{x},{y}": name for (x, y), name in state.location_names.items()},
+        "history": list(state.history),
+        "history_evicted": state.history.evicted,
+        "undo_log": state.undo_log.export(),
+        "npc_queue": list(state.npc_queue),
+        "drone_queue": state.drone_queue.items(),
+        "pursuers": state.pursuers.agents
+    }
+
+
+def _open(data):
+    if data[:4] != MAGIC:
+        raise SaveError("Not a Last Protocol save file.")
+    (version,) = struct.unpack_from("<H", data, 4)
+    if not 1 <= version <= FORMAT_VERSION:
+        raise SaveError(f"Unsupported save format version {version}.")
+    decompressor = zlib.decompressobj()
+    try:
+        body = decompressor.decompress(data[6:])
+    except zlib.error as error:
+        raise SaveError(f"Save file is corrupted: {error}")
+    if not decompressor.eof or decompressor.unused_data:
+        raise SaveError("Save file is truncated or has trailing data; it may be corrupted.")
+    reader = _Reader(body)
+    reader.read_string_table()
+    return reader, version
+
+
+def _placeholder_city():
+    # GameState needs a city to start from; restore() replaces it, so a 1x5 placeholder is enough.
+    grid = Grid.from_rows(["LTBDH"])
+    nodes = {key: {"x": 0, "y": y, "type": "node", "hacked": False} for y, key in enumerate("TBD", 1)}
+    nodes["H"] = {"x": 0, "y": 4, "type": "hub", "unlocked": False}
+    return grid, (0, 0), nodes, {}
+
+
+def main(argv=None):
+    """
+    python savegame.py <file.sav> prints the save as JSON.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.exit("usage: python savegame.py <save file>")
+    print(json.dumps(export_json(load_game(argv[0])), indent=2))
+
+
+if __name__ == "__main__":
+    main()
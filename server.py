@@ -0,0 +1,383 @@
+import argparse, asyncio, signal, sys, time
+
+from campaign import story_text
+from commands import ROUTER
+from engine import GameState
+from grid import generate_city, parse_city_size
+from operations import is_valid_player_name
+from simulate import game_seed
+from world import World, shared_router
+
+IDLE_TIMEOUT = 300 # seconds a session may sit without sending a line
+MAX_LINE = 1024 # longest accepted input line, in bytes
+PROMPT = "\n> "
+
+# save/load would let a remote client write or read any file the server can reach
+SESSION_ROUTER = shared_router(name for name in ROUTER.commands if name not in ("save", "load"))
+
+
+class Session:
+    """
+    One connected operative: their own GameState plus the stream pair it talks over.
+    Nothing is shared between sessions, so one player can never see another's game.
+    """
+    __slots__ = ("state", "reader", "writer", "peer", "started")
+
+    def __init__(self, state, reader, writer):
+        self.state = state
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername") or "local"
+        self.started = time.monotonic()
+
+
+class GameServer:
+    """
+    Hosts many games at once over a plain line protocol (telnet/nc friendly).
+
+    Every connection gets its own interactive GameState. Commands that need more
+    input (hacking guesses, the final protocol) pause inside the engine rather than
+    blocking, so a single event loop serves every session; an idle session costs
+    one suspended coroutine and its game state.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, session_timeout=None, max_sessions=10000,
+                 city_size=None, seed=None):
+        self.idle_timeout = idle_timeout
+        self.session_timeout = session_timeout # overall cap on a session's length, None for no cap
+        self.max_sessions = max_sessions
+        self.city_size = city_size
+        self.seed = seed
+        self.sessions = set()
+        self.connections = 0 # total accepted, also numbers the per-session seeds
+        self._server = None
+        self._handlers = set() # connection tasks still running, cancelled by close()
+
+    async def start(self, host="127.0.0.1", port=8023, path=None):
+        if path:
+            self._server = await asyncio.start_unix_server(self.handle, path, limit=MAX_LINE)
+        else:
+            self._server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        return self._server
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """
+        Stops accepting players and tells everyone still connected.
+        """
+        if self._server is not None:
+            self._server.close()
+        for session in list(self.sessions):
+            self._write(session, "\nServer shutting down. Goodbye, Operative.\n")
+            session.writer.close()
+        self.sessions.clear()
+        handlers = list(self._handlers)
+        for task in handlers:
+            task.cancel() # they may be waiting on a read that would otherwise outlive the loop
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    def session_seed(self):
+        return None if self.seed is None else game_seed(self.seed, self.connections)
+
+    def new_state(self, seed):
+        # Runs in a worker thread: generating a large city takes a second or more
+        city = generate_city(*self.city_size, seed=seed) if self.city_size else None
+        # Path tables are built on the first find_path, so idle sessions stay small
+        return GameState(seed=seed, city=city, interactive=True, precompute_paths=False, router=SESSION_ROUTER)
+
+    async def handle(self, reader, writer):
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b"The network is saturated. Try again later.\n")
+            await _close(writer)
+            return
+
+        self.connections += 1
+        session = Session(None, reader, writer)
+        self.sessions.add(session) # counted towards max_sessions while its game is being built
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            # Built off the event loop, so other players are not frozen while a big city is generated
+            session.state = await asyncio.get_running_loop().run_in_executor(None, self.new_state, self.session_seed())
+            await self.play(session)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass # the client went away
+        except asyncio.CancelledError:
+            pass # the server is shutting down; end quietly rather than as a cancelled task
+        except Exception as error:
+            print(f"Session {session.peer} crashed: {error!r}", file=sys.stderr)
+        finally:
+            self._handlers.discard(task)
+            self.sessions.discard(session)
+            await _close(writer)
+
+    async def ask_name(self, session):
+        """
+        Prompts until the player gives a valid name; None if they leave first.
+        """
+        while True:
+            self._write(session, story_text()["intro"] + " ")
+            await session.writer.drain()
+            name = await self.read_line(session)
+            if name is None or is_valid_player_name(name):
+                return name and name.strip()
+            self._write(session, "Invalid name. Name must contain only alphabetic characters and spaces. Please try again.\n")
+
+    async def play(self, session):
+        state = session.state
+        name = await self.ask_name(session)
+        if name is None:
+            return
+
+        self._write(session, story_text()["start"].format(name) + "\n\nType 'map' to see your starting location.\n" + PROMPT)
+
+        while not state.game_over:
+            await session.writer.drain()
+            line = await self.read_line(session)
+            if line is None:
+                return
+
+            if not line.strip() and not state.awaiting_input:
+                self._write(session, "\nPlease enter a command. Type 'help' for a list of commands.\n" + PROMPT)
+                continue
+
+            try:
+                events = state.step(line)
+            except Exception as error:
+                self._write(session, f"Unexpected error occurred: {error}. Please try again or type 'help' for commands.\n" + PROMPT)
+                continue
+            self._write(session, render_events(events, state))
+
+        await session.writer.drain()
+
+    async def read_line(self, session):
+        """
+        The next line from the client, or None once it disconnects or times out.
+        """
+        timeout = self.idle_timeout
+        if self.session_timeout is not None:
+            remaining = self.session_timeout - (time.monotonic() - session.started)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+            if timeout <= 0:
+                self._write(session, "\nSession time limit reached. Disconnecting.\n")
+                return None
+
+        while True:
+            try:
+                data = await asyncio.wait_for(session.reader.readline(), timeout)
+            except asyncio.TimeoutError:
+                self._write(session, "\nConnection idle for too long. Disconnecting.\n")
+                return None
+            except ValueError:
+                # Longer than MAX_LINE; the reader has already discarded it
+                self._write(session, "\nInput too long.\n")
+                continue
+            if not data:
+                return None
+            return data.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def _write(self, session, text):
+        if not session.writer.is_closing():
+            session.writer.write(text.replace("\n", "\r\n").encode())
+
+
+class SharedWorldServer(GameServer):
+    """
+    Puts every connection into one shared World instead of a game of its own.
+    Lines are queued as they arrive and a ticker runs the world every `tick_interval`
+    seconds, sending each player their own output plus the tick's changes. When someone
+    completes the final protocol everyone is disconnected and a fresh world starts.
+    """
+
+    def __init__(self, tick_interval=0.1, **options):
+        super().__init__(**options)
+        self.tick_interval = tick_interval
+        self.world = self.new_world(self.session_seed())
+        self.clients = {} # player_id -> Session
+        self._ticker = None
+
+    def new_world(self, seed):
+        # After the first, worlds are built in a worker thread (see run_ticks)
+        city = generate_city(*self.city_size, seed=seed) if self.city_size else None
+        return World(seed=seed, city=city)
+
+    def new_state(self, seed):
+        return None # the Player is created once the operative has given a name
+
+    async def start(self, host="127.0.0.1", port=8023, path=None):
+        server = await super().start(host, port, path)
+        self._ticker = asyncio.ensure_future(self.run_ticks())
+        return server
+
+    async def close(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+        await super().close()
+
+    async def run_ticks(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            world = self.world
+            try:
+                updates = world.tick()
+            except Exception as error:
+                # Keep the world running for everyone else; the next tick starts afresh
+                print(f"World tick {world.ticks} crashed: {error!r}", file=sys.stderr)
+                updates = {}
+            for player_id, name, error in world.failures:
+                print(f"Operative {name} (player {player_id}) dropped after a crash: {error!r}", file=sys.stderr)
+            world.failures.clear()
+
+            for player_id, events in updates.items():
+                session = self.clients.get(player_id)
+                if session is not None:
+                    self._write(session, render_world_events(events, session.state))
+                    if player_id not in world.players:
+                        session.writer.close() # quit during this tick
+
+            if world.game_over:
+                for session in list(self.clients.values()):
+                    session.writer.close()
+                self.clients.clear()
+                # Off the event loop, like a GameServer session, so a big city does not freeze everyone
+                self.world = await loop.run_in_executor(None, self.new_world, self.session_seed())
+            await asyncio.sleep(max(0.0, self.tick_interval - (loop.time() - started)))
+
+    async def play(self, session):
+        name = await self.ask_name(session)
+        if name is None:
+            return
+
+        while self.world.game_over:
+            await asyncio.sleep(self.tick_interval) # the next world is still being built
+        world = self.world
+        player = session.state = world.join(name)
+        self.clients[player.player_id] = session
+        self._write(session, story_text()["start"].format(name) + "\n\nYou are not alone in this city. "
+                    "Other operatives are hacking the same nodes.\n" + PROMPT)
+        try:
+            while not world.game_over and player.player_id in world.players:
+                await session.writer.drain()
+                line = await self.read_line(session)
+                if line is None:
+                    return
+                if player.player_id in world.players:
+                    world.submit(player.player_id, line)
+        finally:
+            self.clients.pop(player.player_id, None)
+            world.leave(player.player_id)
+
+
+def render_world_events(events, player):
+    """
+    Text for one tick of a shared world: the player's own output, then news of what
+    other operatives did.
+    """
+    own = []
+    news = []
+    for kind, data in events:
+        if kind in ("output", "prompt"):
+            own.append((kind, data))
+        elif kind == "player_joined" and data[0] != player.player_id:
+            news.append(f"[network] Operative {data[1]} has connected.")
+        elif kind == "player_left":
+            news.append(f"[network] Operative {data[1]} has disconnected.")
+        elif kind == "node_breached":
+            news.append(f"[network] {player.location_names.get(player.node_locations.position_of(data))} has been breached.")
+        elif kind == "hub_unlocked":
+            news.append("[network] All network nodes breached. The Patan Data Hub is now accessible!")
+        elif kind == "world_ending":
+            news.append(f"[network] Operative {data[0]} has executed the final protocol.")
+    if not own and not news:
+        return ""
+    text = render_events(own, player)
+    if news:
+        text = "\n".join(news) + "\n" + text
+    return text
+
+
+def render_events(events, state):
+    """
+    Turns one step's events into the text sent back: its output, then either the
+    question the game is waiting on or the usual command prompt.
+    """
+    lines = []
+    prompt = None
+    for kind, data in events:
+        if kind == "output":
+            lines.append(data)
+        elif kind == "prompt":
+            prompt = data
+    text = "\n".join(lines) + "\n" if lines else ""
+    if state.game_over:
+        return text
+    return text + (prompt if prompt is not None else PROMPT)
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+async def run(options):
+    city_size = None
+    if options.city:
+        try:
+            city_size = parse_city_size(options.city) # checked once here, not on every connection
+        except ValueError as error:
+            sys.exit(f"--city {options.city}: {error}")
+
+    settings = dict(idle_timeout=options.idle_timeout, session_timeout=options.session_timeout,
+                    max_sessions=options.max_sessions, city_size=city_size, seed=options.seed)
+    if options.shared:
+        server = SharedWorldServer(tick_interval=options.tick, **settings)
+    else:
+        server = GameServer(**settings)
+    await server.start(options.host, options.port, options.unix)
+    where = options.unix or f"{options.host}:{options.port}"
+    print(f"The Last Protocol server listening on {where} (Ctrl+C to stop)", file=sys.stderr)
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass # e.g. Windows; Ctrl+C then surfaces as KeyboardInterrupt
+
+    serving = asyncio.ensure_future(server.serve_forever())
+    await stop.wait()
+    await server.close()
+    serving.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many games of The Last Protocol over TCP or a Unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8023)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                        help="seconds of silence before a session is dropped")
+    parser.add_argument("--session-timeout", type=float, default=None, help="maximum length of a session in seconds")
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--city", metavar="ROWSxCOLS", help="give every session a generated city of this size")
+    parser.add_argument("--seed", type=int, default=None, help="base seed; each session derives its own from it")
+    parser.add_argument("--shared", action="store_true", help="put every player into one shared city")
+    parser.add_argument("--tick", type=float, default=0.1, help="seconds per world tick in --shared mode")
+    options = parser.parse_args(argv)
+
+    try:
+        asyncio.run(run(options))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse, hashlib, json, os, sys, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import DEFAULT_SETTINGS, POLICIES, GameState, play
+
+TURN_BUCKET = 10 # width of the turns-to-finish histogram buckets
+
+
+def game_seed(base_seed, index):
+    """
+    Derives an independent 64-bit seed for game `index`, so every game gets its own
+    RNG stream regardless of which worker runs it or how the work is chunked.
+    """
+    digest = hashlib.blake2b(f"{base_seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def empty_totals():
+    return {
+        "games": 0,
+        "outcomes": Counter(),
+        "turn_histogram": Counter(),
+        "turns": 0,
+        "finished_turns": 0,
+        "finished": 0,
+        "vpn_exhausted": 0,
+        "hacks": 0,
+        "hack_failures": 0
+    }
+
+
+def merge_totals(into, part):
+    for key, value in part.items():
+        if isinstance(value, Counter):
+            into[key].update(value)
+        else:
+            into[key] += value
+    return into
+
+
+def run_chunk(base_seed, start, count, policy_name, settings, max_turns):
+    """
+    Worker entry point: plays games start .. start+count-1 and returns their totals.
+    """
+    policy = POLICIES[policy_name]
+    totals = empty_totals()
+    for index in range(start, start + count):
+        seed = game_seed(base_seed, index)
+        result = play(GameState(seed=seed, capture_output=False, settings=settings), policy, max_turns, seed)
+
+        totals["games"] += 1
+        totals["outcomes"][result["outcome"]] += 1
+        totals["turn_histogram"][result["turns"] // TURN_BUCKET * TURN_BUCKET] += 1
+        totals["turns"] += result["turns"]
+        if result["outcome"] != "timeout":
+            totals["finished"] += 1
+            totals["finished_turns"] += result["turns"]
+        totals["vpn_exhausted"] += result["vpn_used"]
+        totals["hacks"] += result["hacks"]
+        totals["hack_failures"] += result["hack_failures"]
+    return totals
+
+
+def simulate(games, base_seed=0, workers=None, policy="greedy", settings=None, max_turns=500, chunk_size=None):
+    """
+    Fans `games` playthroughs out over a process pool and merges the per-chunk totals.
+    Chunks are large enough that pickling the results is negligible next to playing the games.
+    """
+    workers = workers or os.cpu_count() or 1
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    chunk_size = chunk_size or max(1, min(5000, games // (workers * 8) or 1))
+
+    totals = empty_totals()
+    chunks = [(start, min(chunk_size, games - start)) for start in range(0, games, chunk_size)]
+
+    if workers == 1:
+        for start, count in chunks:
+            merge_totals(totals, run_chunk(base_seed, start, count, policy, settings, max_turns))
+        return totals
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_chunk, base_seed, start, count, policy, settings, max_turns)
+                   for start, count in chunks]
+        for future in as_completed(futures):
+            merge_totals(totals, future.result())
+    return totals
+
+
+def summarise(totals):
+    games = totals["games"]
+    attempts = totals["hacks"] + totals["hack_failures"]
+    return {
+        "games": games,
+        "outcomes": {key: count / games for key, count in sorted(totals["outcomes"].items())},
+        "mean_turns": totals["turns"] / games,
+        "mean_turns_to_finish": totals["finished_turns"] / totals["finished"] if totals["finished"] else None,
+        "vpn_exhaustion_rate": totals["vpn_exhausted"] / games,
+        "hack_success_rate": totals["hacks"] / attempts if attempts else None,
+        "turn_histogram": dict(sorted(totals["turn_histogram"].items()))
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balancing runner for The Last Protocol")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0, help="base seed; every game derives its own stream from it")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument("--hack-attempts", type=int, default=DEFAULT_SETTINGS["hack_attempts"])
+    parser.add_argument("--npc-rate", type=float, default=DEFAULT_SETTINGS["npc_spawn_chance"])
+    parser.add_argument("--alert-drones", type=int, default=DEFAULT_SETTINGS["alert_drones"])
+    parser.add_argument("--json", metavar="FILE", help="also write the summary as JSON")
+    options = parser.parse_args(argv)
+    if options.games < 1:
+        parser.error("--games must be at least 1")
+
+    settings = {
+        "hack_attempts": options.hack_attempts,
+        "npc_spawn_chance": options.npc_rate,
+        "alert_drones": options.alert_drones
+    }
+
+    started = time.perf_counter()
+    totals = simulate(options.games, options.seed, options.workers, options.policy, settings, options.max_turns)
+    elapsed = time.perf_counter() - started
+    summary = summarise(totals)
+    summary["settings"] = settings
+    summary["seconds"] = elapsed
+
+    print(f"Simulated {summary['games']} games in {elapsed:.2f}s ({summary['games'] / elapsed:.0f} games/s)")
+    print("Outcomes:")
+    for outcome, rate in summary["outcomes"].items():
+        print(f"  {outcome:<10} {rate:8.2%}")
+    print(f"Mean turns:            {summary['mean_turns']:.2f}")
+    if summary["mean_turns_to_finish"] is not None:
+        print(f"Mean turns to finish:  {summary['mean_turns_to_finish']:.2f}")
+    print(f"VPN_app exhaustion:    {summary['vpn_exhaustion_rate']:.2%}")
+    if summary["hack_success_rate"] is not None:
+        print(f"Hack success rate:     {summary['hack_success_rate']:.2%}")
+    print("Turns histogram:")
+    peak = max(summary["turn_histogram"].values())
+    for bucket, count in summary["turn_histogram"].items():
+        print(f"  {bucket:>4}-{bucket + TURN_BUCKET - 1:<4} {count:>9} {'#' * max(1, 40 * count // peak)}")
+
+    if options.json:
+        with open(options.json, "w") as json_file:
+            json.dump(summary, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
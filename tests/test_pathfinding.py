@@ -0,0 +1,66 @@
+import random
+import unittest
+
+from grid import generate_city
+from pathfinding import HierarchicalPathfinder, PathCache
+
+
+class HierarchicalPathfinderTest(unittest.TestCase):
+    """
+    HPA* against PathCache's exact BFS tables on random cities, before and after
+    obstacles are added and removed.
+    """
+
+    def assert_matches_exact(self, grid, hpa, exact, rng):
+        excess = shortest = 0
+        ends = [(rng.randrange(grid.rows), rng.randrange(grid.cols)) for _ in range(4)] # a BFS table each
+        for _ in range(40):
+            start = (rng.randrange(grid.rows), rng.randrange(grid.cols))
+            end = rng.choice(ends)
+            path = hpa.find_path(start, end)
+            best = exact.distance(start, end)
+            if best is None:
+                self.assertIsNone(path, f"{start} -> {end} is unreachable")
+                continue
+            self.assertIsNotNone(path, f"no path {start} -> {end}; BFS found one of {best}")
+            self.assertEqual((path[0], path[-1]), (start, end))
+            for (x, y), (nx, ny) in zip(path, path[1:]):
+                self.assertEqual(abs(nx - x) + abs(ny - y), 1, f"{start} -> {end} jumps from {(x, y)} to {(nx, ny)}")
+                self.assertFalse(grid.is_blocked(nx, ny), f"{start} -> {end} walks through {(nx, ny)}")
+            moves = len(path) - 1
+            self.assertGreaterEqual(moves, best)
+            self.assertLessEqual(moves, best * 1.5 + hpa.cluster_size, f"{start} -> {end}: {moves} moves, shortest {best}")
+            excess += moves - best
+            shortest += best
+        if shortest:
+            self.assertLess(excess / shortest, 0.1, "paths average more than 10% over the shortest")
+
+    def test_matches_exact_paths_before_and_after_edits(self):
+        for seed in range(3):
+            for cluster_size in (16, 32):
+                with self.subTest(seed=seed, cluster_size=cluster_size):
+                    grid = generate_city(100, 130, seed=seed)[0]
+                    hpa = HierarchicalPathfinder(grid, cluster_size)
+                    exact = PathCache(grid)
+                    rng = random.Random(seed)
+                    self.assert_matches_exact(grid, hpa, exact, rng)
+
+                    for _ in range(3):
+                        for _ in range(60):
+                            position = (rng.randrange(grid.rows), rng.randrange(grid.cols))
+                            grid[position] = "." if grid.is_blocked(*position) else "X"
+                        self.assert_matches_exact(grid, hpa, exact, rng)
+
+    def test_wall_splits_the_map(self):
+        grid = generate_city(40, 40, seed=1, obstacle_density=0)[0]
+        hpa = HierarchicalPathfinder(grid, 8)
+        self.assertEqual(hpa.distance((0, 0), (39, 39)), 78)
+        for y in range(40):
+            grid[20, y] = "X"
+        self.assertIsNone(hpa.find_path((0, 0), (39, 39)))
+        grid[20, 17] = "."
+        self.assertEqual(hpa.distance((0, 0), (39, 39)), PathCache(grid).distance((0, 0), (39, 39)))
+
+
+if __name__ == "__main__":
+    unittest.main()
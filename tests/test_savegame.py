@@ -0,0 +1,133 @@
+import os
+import random
+import unittest
+
+from engine import GameState, greedy_policy
+from savegame import FORMAT_VERSION, SaveError, dumps, load_game, loads
+
+SAVES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saves")
+
+# What every saves/format_v<N>.sav holds: seed 12 on the classic map after seven greedy turns
+# (random.Random("fixture") for the policy), saved by the code of that format version.
+FIXTURE = {
+    "seed": 12,
+    "position": (3, 0),
+    "turns": 7,
+    "inventory": ["encrypted_USB", "decrypt_tool"],
+    "hacked": {"D"},
+    "history": ["Moved south to Unkown Sector", "Moved south to Unkown Sector", "Moved south to Durbar Square Node",
+                "Failed hack attempt at Durbar Square Node", "Failed hack attempt at Durbar Square Node",
+                "Hacked Durbar Square Node"],
+    "npc_queue": ["tourists taking selfies"],
+    "drones": [(1, "Kumari Protocol Drone")],
+    "pursuers": [("drone", "Kumari Protocol Drone", (1, 2)), ("crowd", "tourists taking selfies", (0, 4))]
+}
+
+
+def played(turns, seed=0, **options):
+    # A game after `turns` greedy turns, with the policy's random numbers to carry on from
+    state = GameState(seed=seed, capture_output=False, **options)
+    rng = random.Random(f"policy-{seed}")
+    for _ in range(turns):
+        if state.game_over:
+            break
+        state.step(*greedy_policy(state, rng))
+    return state, rng
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def test_dumps_of_loads_is_the_same_bytes(self):
+        games = [played(turns, seed)[0] for seed in range(4) for turns in (0, 5, 15, 60)]
+        games.append(GameState.generated(30, 40, seed=3, capture_output=False))
+        undone = played(10, seed=1)[0]
+        undone.step("undo 3") # leaves redo entries in the log
+        games.append(undone)
+        for state in games:
+            data = dumps(state)
+            with self.subTest(seed=state.seed, turns=state.turns):
+                self.assertEqual(dumps(loads(data)), data)
+
+    def test_play_continues_identically_after_a_load(self):
+        for seed in range(3):
+            original, rng = played(6, seed)
+            loaded = loads(dumps(original), capture_output=False)
+            loaded_rng = random.Random()
+            loaded_rng.setstate(rng.getstate())
+            while not original.game_over and original.turns < 200:
+                move = greedy_policy(original, rng)
+                self.assertEqual(greedy_policy(loaded, loaded_rng), move)
+                self.assertEqual(loaded.step(*move), original.step(*move))
+                self.assertEqual(dumps(loaded), dumps(original))
+            self.assertEqual(loaded.outcome, original.outcome)
+
+    def test_damaged_saves_are_rejected(self):
+        data = dumps(played(5)[0])
+        for damaged in (b"nope" + data[4:], data[:4] + bytes([FORMAT_VERSION + 1, 0]) + data[6:], data[:40], data + b"!"):
+            with self.assertRaises(SaveError):
+                loads(damaged)
+
+
+class OldFormatTest(unittest.TestCase):
+    """
+    Saves written by every earlier format version must still load and keep playing.
+    """
+
+    def load_fixture(self, version):
+        return load_game(os.path.join(SAVES, f"format_v{version}.sav"), capture_output=False)
+
+    def assert_fixture(self, state):
+        self.assertEqual(state.seed, FIXTURE["seed"])
+        self.assertEqual(state.player_position, FIXTURE["position"])
+        self.assertEqual(state.turns, FIXTURE["turns"])
+        self.assertEqual(state.inventory, FIXTURE["inventory"])
+        self.assertEqual(set(state.node_locations.hacked_keys()), FIXTURE["hacked"])
+        self.assertEqual(list(state.history), FIXTURE["history"])
+        self.assertEqual(list(state.npc_queue), FIXTURE["npc_queue"])
+        self.assertEqual(state.drone_queue.items(), FIXTURE["drones"])
+        self.assertEqual(state.campaign, "kathmandu")
+
+    def assert_playable(self, state):
+        # An old save upgrades to the current format and plays on like a game that never left
+        upgraded = loads(dumps(state), capture_output=False)
+        self.assertEqual(dumps(upgraded), dumps(state))
+        for command in ("move north", "move north", "move east", "undo", "redo"):
+            self.assertEqual(upgraded.step(command), state.step(command))
+        self.assertEqual(dumps(upgraded), dumps(state))
+
+    def test_every_version_has_a_fixture(self):
+        for version in range(1, FORMAT_VERSION + 1):
+            self.assertTrue(os.path.exists(os.path.join(SAVES, f"format_v{version}.sav")),
+                            f"add a saves/format_v{version}.sav written by format {version}")
+
+    def test_version_1_position_stack(self):
+        state = self.load_fixture(1)
+        self.assert_fixture(state)
+        self.assertEqual(len(state.undo_log), 0) # only positions were kept, so there is nothing to undo
+        self.assertEqual(state.pursuers.agents, [])
+        self.assert_playable(state)
+
+    def test_version_2_undo_log(self):
+        state = self.load_fixture(2)
+        self.assert_fixture(state)
+        self.assertEqual(len(state.undo_log), FIXTURE["turns"])
+        self.assertEqual(state.pursuers.agents, []) # they appear after the next turn
+        self.assert_playable(state)
+
+    def test_version_3_pursuers(self):
+        state = self.load_fixture(3)
+        self.assert_fixture(state)
+        self.assertEqual(len(state.undo_log), FIXTURE["turns"])
+        self.assertEqual(state.pursuers.agents, FIXTURE["pursuers"])
+        self.assert_playable(state)
+
+    def test_version_4_campaign(self):
+        state = self.load_fixture(4)
+        self.assert_fixture(state)
+        self.assertEqual(state.pursuers.agents, FIXTURE["pursuers"])
+        self.assertEqual(state.hub_key, "H")
+        self.assert_playable(state)
+
+
+if __name__ == "__main__":
+    unittest.main()
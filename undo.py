@@ -0,0 +1,150 @@
+from collections import deque
+
+
+class UndoLog:
+    """
+    Multi-level undo/redo of whole turns.
+
+    Before a command runs, capture() takes a cheap snapshot of the small, mutable parts
+    of the game (position, inventory, hacked nodes, crowd and drone queues and where
+    they are on the map, turn counter).
+    Afterwards record() keeps only the fields that actually changed, as (before, after) pairs,
+    so undoing or redoing a turn costs time proportional to what that turn changed.
+
+    Only the last `depth` turns are kept. The history log is not rewound: it records
+    the undo itself, like the rest of the player's actions.
+    """
+
+    FIELDS = ("position", "turns", "final_ready", "inventory", "hacked", "npcs", "drones", "pursuers")
+
+    def __init__(self, depth=100):
+        self.depth = depth
+        self.undo_entries = deque(maxlen=depth) # oldest turns fall off the far end
+        self.redo_entries = []
+
+    def __len__(self):
+        return len(self.undo_entries)
+
+    def capture(self, state):
+        return (
+            state.player_position,
+            state.turns,
+            state.final_ready,
+            tuple(state.inventory),
+            state.node_locations.hacked_keys(),
+            (tuple(state.npc_queue), state.npc_queue.dropped),
+            tuple(state.drone_queue.items()),
+            state.pursuers.snapshot()
+        )
+
+    def record(self, state, before):
+        """
+        Stores the difference between `before` (from capture()) and the state now.
+        A new action makes the redo entries unreachable, so they are dropped.
+        """
+        after = self.capture(state)
+        delta = {field: (old, new) for field, old, new in zip(self.FIELDS, before, after) if old != new}
+        if delta:
+            self.undo_entries.append(delta)
+            self.redo_entries.clear()
+        return bool(delta)
+
+    def undo(self, state, count=1):
+        """
+        Reverts up to `count` turns. Returns how many were undone.
+        """
+        done = 0
+        while done < count and self.undo_entries:
+            delta = self.undo_entries.pop()
+            for field, (old, new) in delta.items():
+                _apply(state, field, old, new)
+            self.redo_entries.append(delta)
+            done += 1
+        return done
+
+    def redo(self, state, count=1):
+        """
+        Re-applies up to `count` undone turns. Returns how many were redone.
+        """
+        done = 0
+        while done < count and self.redo_entries:
+            delta = self.redo_entries.pop()
+            for field, (old, new) in delta.items():
+                _apply(state, field, new, old)
+            self.undo_entries.append(delta)
+            done += 1
+        return done
+
+    def clear(self):
+        self.undo_entries.clear()
+        self.redo_entries.clear()
+
+    def export(self):
+        """
+        The log as plain lists, for save files and JSON dumps.
+        """
+        return {
+            "depth": self.depth,
+            "undo": [_export_delta(delta) for delta in self.undo_entries],
+            "redo": [_export_delta(delta) for delta in self.redo_entries]
+        }
+
+    @classmethod
+    def from_export(cls, data):
+        log = cls(data["depth"])
+        log.undo_entries.extend(_import_delta(delta) for delta in data["undo"])
+        log.redo_entries.extend(_import_delta(delta) for delta in data["redo"])
+        return log
+
+
+def _apply(state, field, value, current):
+    # Sets one field of the state to `value`; `current` is what it holds now
+    if field == "position":
+        state.player_position = value
+    elif field == "turns":
+        state.turns = value
+    elif field == "final_ready":
+        state.final_ready = value
+    elif field == "inventory":
+        state.inventory = list(value)
+    elif field == "hacked":
+        for key in value ^ current: # only the nodes whose flag differs
+            state.node_locations.set_hacked(key, key in value)
+    elif field == "npcs":
+        # Refilled in place so anything holding the queues keeps seeing the live ones
+        crowds, dropped = value
+        state.npc_queue.drain(len(state.npc_queue))
+        state.npc_queue.enqueue_many(crowds)
+        state.npc_queue.dropped = dropped
+    elif field == "drones":
+        drones = state.drone_queue
+        while len(drones):
+            drones.dequeue()
+        for priority, drone in value:
+            drones.enqueue(drone, priority)
+    elif field == "pursuers":
+        state.pursuers.restore(value)
+
+
+def _export_delta(delta):
+    exported = {}
+    for field, (old, new) in delta.items():
+        if field == "hacked":
+            old, new = sorted(old), sorted(new)
+        exported[field] = [old, new]
+    return exported
+
+
+def _import_delta(exported):
+    # JSON turns tuples into lists; put back the shapes capture() produces
+    converters = {
+        "position": tuple,
+        "turns": int,
+        "final_ready": bool,
+        "inventory": tuple,
+        "hacked": frozenset,
+        "npcs": lambda value: (tuple(value[0]), value[1]),
+        "drones": lambda value: tuple((priority, drone) for priority, drone in value),
+        "pursuers": lambda value: tuple((kind, label, tuple(position)) for kind, label, position in value)
+    }
+    return {field: (converters[field](old), converters[field](new)) for field, (old, new) in exported.items()}
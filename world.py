@@ -0,0 +1,206 @@
+import random
+from collections import deque
+
+from campaign import classic_city
+from commands import CommandRouter, ROUTER
+from data_structures import Queue, PriorityQueue
+from engine import DEFAULT_SETTINGS, GameState
+from locations import LocationRegistry
+from operations import handle_npc_crowd, handle_drone_patrol
+from pathfinding import path_finder
+from simulate import game_seed
+
+# Commands that make sense when the city is shared. undo/redo, save/load would rewind or replace
+# everyone's world, so they are left out.
+SHARED_COMMANDS = ("move", "hack", "bypass", "inventory", "history", "map", "find_path", "help", "quit")
+COMMANDS_PER_TICK = 1 # lines a player may run per tick; keeps a tick's work proportional to the player count
+
+
+def shared_router(names=SHARED_COMMANDS):
+    """
+    A router with only the named commands of the game's ROUTER.
+    """
+    router = CommandRouter()
+    for name in names:
+        command = ROUTER.commands[name]
+        router.register(command.name, command.handler, command.aliases, command.args, command.usage,
+                        command.ends_turn, command.journaled, command.undoable)
+    return router
+
+
+WORLD_ROUTER = shared_router()
+
+
+class Player(GameState):
+    """
+    One operative in a shared World. It is an ordinary GameState (own position, inventory,
+    history and pending prompts) whose map, locations, drones and crowds are the world's.
+    NPCs and drones move once per world tick rather than after each of its commands.
+    """
+
+    def __init__(self, world, player_id, name):
+        seed = None if world.seed is None else game_seed(world.seed, player_id)
+        city = (world.game_map, world.start, world.node_locations, world.location_names)
+        super().__init__(seed=seed, city=city, settings=dict(world.settings, undo_depth=0), interactive=True,
+                         router=WORLD_ROUTER, precompute_paths=False)
+        self.player_id = player_id
+        self.name = name
+        self.node_locations = world.node_locations
+        self.location_names = world.location_names
+        self.path_cache = world.path_cache
+        self.npc_queue = world.npc_queue
+        self.drone_queue = world.drone_queue
+        self.inbox = deque() # lines waiting for the next ticks
+        self.outbox = [] # events to send at the end of the tick
+
+    def _end_turn(self):
+        self.turns += 1
+        self.final_ready = self.at_final_hub()
+
+
+class World:
+    """
+    An authoritative shared Kathmandu: node hacks, the drone queue and NPC crowds are
+    common to every player.
+
+    Players queue command lines with submit(); tick() runs up to COMMANDS_PER_TICK of
+    each player's lines, advances the NPCs and drones once, and returns the events each
+    player should see. Players act in a fixed order that rotates every tick, so when two
+    of them race (the same node, the last drone, the hub) the winner is decided by
+    the tick number and join order alone, never by network timing.
+
+    Apart from each player's own command output, clients only receive what changed
+    during the tick (see _diff).
+    """
+
+    def __init__(self, seed=None, city=None, settings=None, commands_per_tick=COMMANDS_PER_TICK):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.commands_per_tick = commands_per_tick
+
+        game_map, start, node_locations, location_names = city or classic_city()
+        self.game_map = game_map
+        self.start = start
+        self.node_locations = LocationRegistry(node_locations, location_names)
+        self.location_names = self.node_locations.names
+        self.path_cache = path_finder(game_map, self.node_locations)
+        self.npc_queue = Queue(capacity=8, bounded=True)
+        self.drone_queue = PriorityQueue(max_size=self.settings["drone_capacity"])
+
+        self.players = {} # player_id -> Player, in join order
+        self.ticks = 0
+        self.outcome = None # set when some player completes the final protocol
+        self.winner = None
+        self._next_id = 0
+        self._changes = [] # joins, leaves and world messages since the last tick
+        self._moved = set()
+        self._seen_hacked = self.node_locations.hacked_keys()
+        self._seen_drones = ()
+        self._seen_crowds = 0
+        self.failures = [] # (player_id, name, error) for players dropped because a command crashed
+
+    @property
+    def game_over(self):
+        return self.outcome is not None
+
+    def join(self, name):
+        player_id = self._next_id
+        self._next_id += 1
+        player = self.players[player_id] = Player(self, player_id, name)
+        self._changes.append(("player_joined", (player_id, name, player.player_position)))
+        return player
+
+    def leave(self, player_id):
+        player = self.players.pop(player_id, None)
+        if player is not None:
+            self._changes.append(("player_left", (player_id, player.name)))
+            self._moved.discard(player_id)
+
+    def submit(self, player_id, line):
+        self.players[player_id].inbox.append(line)
+
+    def tick(self):
+        """
+        Advances the world by one tick. Returns {player_id: [events]} for every player
+        with something to show.
+        """
+        self.ticks += 1
+        players = list(self.players.values())
+        if players and self.outcome is None:
+            shift = self.ticks % len(players)
+            acted = False
+            for player in players[shift:] + players[:shift]:
+                for _ in range(self.commands_per_tick):
+                    if not player.inbox or self.outcome is not None or player.player_id not in self.players:
+                        break
+                    try:
+                        acted = self._run(player, player.inbox.popleft()) or acted
+                    except Exception as error:
+                        # A command that blows up takes its player out, not the world
+                        self.failures.append((player.player_id, player.name, error))
+                        player.outbox.append(("output", f"Unexpected error occurred: {error}. Disconnecting."))
+                        self.leave(player.player_id)
+
+            if acted and self.outcome is None:
+                # The world moves once per tick, however many players acted
+                handle_npc_crowd(self.npc_queue, self.rng, self.settings["npc_spawn_chance"])
+                messages = []
+                handle_drone_patrol(self.drone_queue, messages.append)
+                self._changes.extend(("output", message) for message in messages)
+
+        diff = self._diff()
+        updates = {}
+        for player in players:
+            events = player.outbox + diff
+            player.outbox = []
+            if events:
+                updates[player.player_id] = events
+        if self.outcome is None:
+            for player in players:
+                if player.game_over and player.player_id in self.players:
+                    self.leave(player.player_id) # quit or backed out; announced next tick
+        return updates
+
+    def _run(self, player, line):
+        # Returns True if the line took game time
+        position, turns = player.player_position, player.turns
+        player.outbox.extend(player.step(line))
+        if player.player_position != position:
+            self._moved.add(player.player_id)
+        if player.outcome in ("good", "bad"):
+            self.outcome = player.outcome
+            self.winner = player
+            self._changes.append(("world_ending", (player.name, player.outcome)))
+        return player.turns != turns
+
+    def _diff(self):
+        """
+        The tick's changes to shared state as events, each costing time in proportion to what changed:
+        the hacked set is only compared by identity unless a hack replaced it.
+        """
+        diff, self._changes = self._changes, []
+
+        if self._moved:
+            diff.append(("player_moved", {player_id: self.players[player_id].player_position
+                                          for player_id in sorted(self._moved)}))
+            self._moved = set()
+
+        hacked = self.node_locations.hacked_keys()
+        if hacked is not self._seen_hacked:
+            for key in sorted(hacked - self._seen_hacked):
+                diff.append(("node_breached", key))
+            if self.node_locations.all_nodes_hacked() and not self._seen_hacked >= hacked:
+                diff.extend(("hub_unlocked", hub) for hub in self.node_locations.of_type('hub'))
+            self._seen_hacked = hacked
+
+        drones = tuple(self.drone_queue.items())
+        if drones != self._seen_drones:
+            diff.append(("drones", drones))
+            self._seen_drones = drones
+
+        crowds = len(self.npc_queue)
+        if crowds != self._seen_crowds:
+            diff.append(("crowds", crowds))
+            self._seen_crowds = crowds
+        return diff